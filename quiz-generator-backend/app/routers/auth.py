@@ -5,8 +5,6 @@ from typing import Optional
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from passlib.exc import MissingBackendError
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -21,7 +19,18 @@ from crud.user_crud import (
     update_user_password,
 )
 from app.services.email_service import send_password_reset_email
-from database.models import User, Quiz, UserScore, Friendship, Notification, Generation
+from app.services.password_hashing import (
+    HashingBackendUnavailable,
+    PasswordHasherBusy,
+    PasswordTooLong,
+    password_hasher,
+)
+from app.services.principal_cache import principal_cache
+from crud.question_fingerprint_crud import delete_quiz_fingerprints
+from crud.leaderboard_crud import delete_user_leaderboards, list_score_user_ids, refresh_user_leaderboards
+from crud.quiz_search_crud import delete_quiz_search
+from crud.quiz_stats_crud import delete_quiz_stats, refresh_quiz_stats
+from database.models import User, Quiz, UserScore, Friendship, Notification, Generation, GenerationJob, GenerationQuota, WarmPoolDelivery
 import os
 import secrets
 
@@ -38,11 +47,17 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-pwd_context = CryptContext(
-    schemes=["bcrypt_sha256", "bcrypt"],
-    deprecated=["bcrypt"],
-)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+# For endpoints that also serve anonymous callers
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+
+# Comma-separated emails allowed to read everyone's generation usage and the
+# process-internal metrics endpoints
+USAGE_ADMIN_EMAILS = {
+    email.strip().lower()
+    for email in os.getenv("USAGE_ADMIN_EMAILS", "").split(",")
+    if email.strip()
+}
 
 
 class Token(BaseModel):
@@ -54,6 +69,13 @@ class TokenData(BaseModel):
     email: Optional[str] = None
 
 
+class TokenClaims(BaseModel):
+    """Principal as asserted by a verified access token, without a database lookup."""
+    user_id: int
+    email: Optional[str] = None
+    token_version: int = 0
+
+
 class UserCreate(BaseModel):
     email: str
     password: str
@@ -90,22 +112,33 @@ class ResetPasswordRequest(BaseModel):
     password: str
 
 
-def verify_password(plain_password, hashed_password):
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many authentication requests; please retry shortly.",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def verify_password(plain_password, hashed_password):
+    """Returns (valid, new_hash); new_hash is set when the stored hash should be upgraded."""
     try:
-        return pwd_context.verify(plain_password, hashed_password)
-    except (ValueError, MissingBackendError):
-        return False
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
 
 
-def get_password_hash(password):
+async def get_password_hash(password):
     try:
-        return pwd_context.hash(password)
-    except ValueError as exc:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    except PasswordTooLong as exc:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password too long; please use 72 characters or fewer.",
         ) from exc
-    except MissingBackendError as exc:
+    except HashingBackendUnavailable as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Password hashing backend unavailable; try again later.",
@@ -126,9 +159,8 @@ async def forgot_password(payload: ForgotPasswordRequest, db: AsyncSession = Dep
 
         token = secrets.token_urlsafe(32)
         expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).replace(tzinfo=None)
-        reset_token = await create_password_reset_token(db, user.id, token, expires_at)
+        await create_password_reset_token(db, user.id, token, expires_at)
         await db.commit()
-        await db.refresh(reset_token)
     except Exception:
         await db.rollback()
         logger.exception("Failed to create password reset token")
@@ -137,7 +169,7 @@ async def forgot_password(payload: ForgotPasswordRequest, db: AsyncSession = Dep
             detail="Unable to process password reset request. Please try again later.",
         )
 
-    email_sent = await send_password_reset_email(user_email, reset_token.token)
+    email_sent = await send_password_reset_email(user_email, token)
     if not email_sent:
         logger.warning("Password reset email could not be delivered.")
 
@@ -158,11 +190,14 @@ async def reset_password(payload: ResetPasswordRequest, db: AsyncSession = Depen
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not found for this token.")
 
     try:
-        hashed_password = get_password_hash(payload.password)
+        hashed_password = await get_password_hash(payload.password)
         await update_user_password(db, user, hashed_password)
+        # Sign out every existing session
+        user.token_version = (user.token_version or 0) + 1
 
         reset_token.used_at = datetime.now(timezone.utc).replace(tzinfo=None)
         await db.commit()
+        principal_cache.invalidate(user.id)
     except HTTPException:
         await db.rollback()
         raise
@@ -185,32 +220,106 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+def create_user_access_token(user: User) -> str:
+    """Token for ``user`` carrying its id and token version alongside the email."""
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id, "ver": user.token_version or 0},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
     )
+
+
+_credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def _decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
     except JWTError:
-        raise credentials_exception
-    user = await get_user_by_email(db, email=token_data.email)
-    if user is None:
-        raise credentials_exception
+        raise _credentials_exception
+    if payload.get("sub") is None and payload.get("uid") is None:
+        raise _credentials_exception
+    return payload
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    payload = _decode_token(token)
+    user_id = payload.get("uid")
+    if user_id is not None:
+        version = payload.get("ver", 0)
+        cache_key = f"uid:{user_id}"
+        user = await principal_cache.get(db, cache_key)
+        if user is not None and user.token_version == version:
+            return user
+        # Primary-key lookup; served from the session's identity map when loaded
+        user = await db.get(User, user_id)
+        if user is None or (user.token_version or 0) != version:
+            raise _credentials_exception
+        principal_cache.put(cache_key, user)
+        return user
+
+    # Tokens issued before uid claims existed identify the user by email only.
+    # They carry no version either, so they count as version 0 and are revoked
+    # by the first password change or reset like any other token.
+    email = payload.get("sub")
+    version = payload.get("ver", 0)
+    user = await principal_cache.get(db, email)
+    if user is not None and (user.token_version or 0) == version:
+        return user
+    user = await get_user_by_email(db, email=email)
+    if user is None or (user.token_version or 0) != version:
+        raise _credentials_exception
+    principal_cache.put(email, user)
     return user
 
 
+async def get_token_claims(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> TokenClaims:
+    """Authorize from the signed token alone, without touching the database.
+
+    Revoked tokens (see User.token_version) stay accepted here until they
+    expire, so only use this for read-only endpoints on the caller's own data.
+    Legacy tokens without a uid claim fall back to get_current_user.
+    """
+    payload = _decode_token(token)
+    if payload.get("uid") is None:
+        user = await get_current_user(token, db)
+        return TokenClaims(user_id=user.id, email=user.email, token_version=user.token_version or 0)
+    try:
+        return TokenClaims(
+            user_id=payload["uid"],
+            email=payload.get("sub"),
+            token_version=payload.get("ver", 0),
+        )
+    except ValueError:
+        raise _credentials_exception
+
+
+async def get_optional_token_claims(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Optional[TokenClaims]:
+    """Like get_token_claims, but None for anonymous requests; invalid tokens still get 401."""
+    if token is None:
+        return None
+    return await get_token_claims(token, db)
+
+
+async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """Current user, provided their email is listed in USAGE_ADMIN_EMAILS."""
+    if current_user.email.lower() not in USAGE_ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+
 @router.post("/register", response_model=Token)
 async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     existing_user = await get_user_by_email(db, user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
 
     db_user = User(
         email=user.email,
@@ -221,27 +330,25 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     await db.commit()
     await db.refresh(db_user)
 
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": create_user_access_token(db_user), "token_type": "bearer"}
 
 
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     user = await get_user_by_email(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = await verify_password(form_data.password, user.hashed_password if user else None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
         )
+    if new_hash:
+        # Cost parameters or scheme changed since this hash was made
+        await update_user_password(db, user, new_hash)
+        await db.commit()
+        principal_cache.invalidate(user.id)
 
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": create_user_access_token(user), "token_type": "bearer"}
 
 
 @router.get("/me", response_model=UserResponse)
@@ -255,18 +362,27 @@ async def update_user_me(update: UserUpdate, current_user: User = Depends(get_cu
             raise HTTPException(status_code=400, detail="Username must be at least 2 characters")
         current_user.username = update.username.strip()
     await db.commit()
+    principal_cache.invalidate(current_user.id)
     await db.refresh(current_user)
     return current_user
 
 @router.post("/change-password")
 async def change_password(payload: ChangePasswordRequest, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    if not verify_password(payload.current_password, current_user.hashed_password):
+    valid, _ = await verify_password(payload.current_password, current_user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     if len(payload.new_password) < 6:
         raise HTTPException(status_code=400, detail="New password must be at least 6 characters")
-    current_user.hashed_password = get_password_hash(payload.new_password)
+    current_user.hashed_password = await get_password_hash(payload.new_password)
+    # Revoke other sessions; the caller continues with the token returned here
+    current_user.token_version = (current_user.token_version or 0) + 1
     await db.commit()
-    return {"message": "Password changed successfully"}
+    principal_cache.invalidate(current_user.id)
+    return {
+        "message": "Password changed successfully",
+        "access_token": create_user_access_token(current_user),
+        "token_type": "bearer",
+    }
 
 _ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
 _MAX_UPLOAD_BYTES = 5 * 1024 * 1024  # 5 MB
@@ -300,6 +416,7 @@ async def upload_avatar(
     url = await _save_upload(file, "avatars", current_user.id)
     current_user.avatar_url = url
     await db.commit()
+    principal_cache.invalidate(current_user.id)
     await db.refresh(current_user)
     return current_user
 
@@ -312,6 +429,7 @@ async def upload_cover(
     url = await _save_upload(file, "covers", current_user.id)
     current_user.cover_url = url
     await db.commit()
+    principal_cache.invalidate(current_user.id)
     await db.refresh(current_user)
     return current_user
 
@@ -321,15 +439,38 @@ async def delete_account(current_user: User = Depends(get_current_user), db: Asy
     # Delete scores by other users on quizzes owned by this user
     user_quiz_ids = (await db.execute(select(Quiz.id).where(Quiz.owner_id == current_user.id))).scalars().all()
     if user_quiz_ids:
+        player_ids = await list_score_user_ids(db, user_quiz_ids)
         await db.execute(sql_delete(UserScore).where(UserScore.quiz_id.in_(user_quiz_ids)))
+        await refresh_user_leaderboards(db, [player_id for player_id in player_ids if player_id != current_user.id])
+        await delete_quiz_fingerprints(db, user_quiz_ids)
+        await delete_quiz_search(db, user_quiz_ids)
+        await delete_quiz_stats(db, user_quiz_ids)
     # Delete all related data
+    attempted_quiz_ids = (await db.execute(
+        select(UserScore.quiz_id).where(UserScore.user_id == current_user.id).distinct()
+    )).scalars().all()
     await db.execute(sql_delete(UserScore).where(UserScore.user_id == current_user.id))
+    await refresh_quiz_stats(db, attempted_quiz_ids)
+    await delete_user_leaderboards(db, current_user.id)
     await db.execute(sql_delete(Notification).where(or_(Notification.user_id == current_user.id, Notification.actor_user_id == current_user.id)))
     await db.execute(sql_delete(Friendship).where(or_(Friendship.requester_id == current_user.id, Friendship.addressee_id == current_user.id)))
     await db.execute(sql_delete(Generation).where(Generation.user_id == current_user.id))
+    await db.execute(sql_delete(GenerationQuota).where(GenerationQuota.user_id == current_user.id))
+    await db.execute(sql_delete(GenerationJob).where(GenerationJob.user_id == current_user.id))
+    await db.execute(sql_delete(WarmPoolDelivery).where(WarmPoolDelivery.user_id == current_user.id))
     # Delete quizzes owned by user
     await db.execute(sql_delete(Quiz).where(Quiz.owner_id == current_user.id))
     # Delete user (cascades to reset tokens)
+    user_id = current_user.id
     await db.delete(current_user)
     await db.commit()
+    principal_cache.invalidate(user_id)
     return {"message": "Account deleted successfully"}
+
+@router.get("/stats")
+async def get_auth_stats(admin: User = Depends(get_admin_user)):
+    """Process-local authenticated-user cache and password hashing metrics."""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+    }
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from database.database import get_db
 from database.models import User, Quiz, UserScore
 from app.routers.auth import get_current_user
-from crud.quiz_crud import create_quiz, get_quiz, update_quiz, delete_quiz
-from schemas.quiz import QuizCreate, QuizResponse, QuizUpdate
-from sqlalchemy import select
+from app.services.conditional_requests import etag_matches, quiz_etag
+from app.services.quiz_validation import question_errors
+from crud.quiz_crud import create_quiz, get_quiz, get_quiz_version, list_quiz_summaries, update_quiz, delete_quiz
+from schemas.quiz import QuizCreate, QuizResponse, QuizSummaryResponse, QuizUpdate
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(prefix="/editor", tags=["editor"])
 
@@ -25,18 +26,29 @@ async def create_custom_quiz(
 @router.get("/quiz/{quiz_id}", response_model=QuizResponse)
 async def get_quiz_for_editing(
     quiz_id: int, 
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db), 
     current_user: User = Depends(get_current_user)
 ):
     """Get a quiz for editing (only if user owns it)"""
-    quiz = await get_quiz(db, quiz_id)
-    if not quiz:
+    version = await get_quiz_version(db, quiz_id)
+    if not version:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
     # Check if user owns the quiz (if owner_id exists)
-    if hasattr(quiz, 'owner_id') and quiz.owner_id and quiz.owner_id != current_user.id:
+    if version.owner_id and version.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="You can only edit quizzes you created")
     
+    headers = {"ETag": quiz_etag(version.id, version.updated_at), "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    quiz = await get_quiz(db, quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    response.headers["ETag"] = quiz_etag(quiz.id, quiz.updated_at)
+    response.headers["Cache-Control"] = "private, no-cache"
     return quiz
 
 @router.put("/quiz/{quiz_id}", response_model=QuizResponse)
@@ -82,19 +94,18 @@ async def delete_custom_quiz(
     
     return {"message": "Quiz deleted successfully"}
 
-@router.get("/my-quizzes", response_model=List[QuizResponse])
+@router.get("/my-quizzes", response_model=List[QuizSummaryResponse])
 async def get_my_created_quizzes(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all quizzes created by the current user"""
+    """Get all quizzes created by the current user (without questions; load one via /editor/quiz/{id})"""
     # Filter by owner_id to show only user's own quizzes
-    result = await db.execute(
-        select(Quiz)
-        .where(Quiz.owner_id == current_user.id)
-        .order_by(Quiz.created_at.desc())
+    return await list_quiz_summaries(
+        db,
+        [Quiz.owner_id == current_user.id],
+        order_by=(Quiz.created_at.desc(), Quiz.id.desc()),
     )
-    return result.scalars().all()
 
 @router.post("/quiz/{quiz_id}/duplicate", response_model=QuizResponse)
 async def duplicate_quiz(
@@ -133,19 +144,7 @@ async def validate_quiz(quiz_data: QuizCreate):
         errors.append("Quiz must have at least one question")
     
     for i, question in enumerate(quiz_data.questions):
-        if not question.question or len(question.question.strip()) < 5:
-            errors.append(f"Question {i+1}: Question text must be at least 5 characters long")
-        
-        if not question.options or len(question.options) < 2:
-            errors.append(f"Question {i+1}: Must have at least 2 options")
-        
-        if not question.answer or question.answer not in question.options:
-            errors.append(f"Question {i+1}: Must select a valid answer from the options")
-        
-        # Check for empty options
-        for j, option in enumerate(question.options):
-            if not option or len(option.strip()) == 0:
-                errors.append(f"Question {i+1}, Option {j+1}: Cannot be empty")
+        errors.extend(question_errors(question.model_dump(), i + 1))
     
     if errors:
         return {"valid": False, "errors": errors}
@@ -1,26 +1,59 @@
+import asyncio
+import json
 import logging
-from datetime import datetime, timezone
-from typing import List, Optional
+import os
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.routers.auth import get_current_user
-from app.services.mistral_service import generate_quiz_content
-from app.services.quiz_service import save_generated_quiz
-from database.database import get_db
-from database.models import User, Generation
+from app.routers.auth import USAGE_ADMIN_EMAILS, TokenClaims, get_admin_user, get_current_user, get_token_claims
+from app.services.generation_jobs import generation_job_queue
+from app.services.mistral_service import (
+    DEFAULT_QUESTIONS_COUNT,
+    MAX_QUESTIONS_COUNT,
+    generate_quiz_content,
+    generation_cache,
+    mistral_service,
+    stream_quiz_content,
+)
+from app.services.question_index import replace_known_duplicates
+from app.services.quiz_service import (
+    build_generated_quiz_data,
+    build_generation,
+    quota_day,
+    refund_generations,
+    remaining_generations,
+    reserve_generations,
+    save_generated_quiz,
+)
+from app.services.resilience import CircuitOpenError
+from app.services.usage import summarize_usage, track_usage
+from app.services.warm_pool import warm_pool
+from crud.quiz_crud import create_quizzes, get_quiz
+from crud.generation_crud import aggregate_generation_usage, generation_latency_percentiles
+from crud.generation_job_crud import create_generation_job, get_generation_job
+from database.database import SessionLocal, get_db
+from database.models import User
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/generate", tags=["quiz-generation"])
 
+# Batch generation settings:
+# - BATCH_GENERATION_MAX_ITEMS: max quizzes accepted in one batch request
+# - BATCH_GENERATION_CONCURRENCY: upstream calls in flight per batch
+BATCH_GENERATION_MAX_ITEMS = int(os.getenv("BATCH_GENERATION_MAX_ITEMS", "30"))
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "5"))
+
 class QuizRequest(BaseModel):
     topic: str
     difficulty: str
     language: str
+    questions_count: int = Field(DEFAULT_QUESTIONS_COUNT, ge=1, le=MAX_QUESTIONS_COUNT)
 
 class QuizQuestion(BaseModel):
     question: str
@@ -34,8 +67,71 @@ class GeneratedQuizResponse(BaseModel):
     difficulty: str
     questions: List[QuizQuestion]
 
-# Daily generation limit per user
-DAILY_GENERATION_LIMIT = 5
+class BatchQuizRequest(BaseModel):
+    requests: List[QuizRequest] = Field(..., min_length=1, max_length=BATCH_GENERATION_MAX_ITEMS)
+
+class BatchQuizItemResult(BaseModel):
+    index: int
+    status: str  # 'succeeded' | 'failed'
+    quiz: Optional[GeneratedQuizResponse] = None
+    error: Optional[str] = None
+
+class BatchQuizResponse(BaseModel):
+    results: List[BatchQuizItemResult]
+    succeeded: int
+    failed: int
+    remaining: int
+
+class GenerationJobResponse(BaseModel):
+    id: int
+    status: str
+    topic: str
+    difficulty: str
+    language: str
+    questions_count: int
+    attempts: int
+    quiz_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[GeneratedQuizResponse] = None
+
+def _upstream_unavailable(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Quiz generation is temporarily unavailable. Please try again shortly.",
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+    )
+
+
+def _ensure_upstream_available():
+    """Fail fast before streaming or fanning out while the circuit is open."""
+    retry_after = mistral_service.breaker.retry_after()
+    if retry_after > 0:
+        raise _upstream_unavailable(retry_after)
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _record_failed_generation(user_id: int, usage):
+    """Keep the accounting of a failed generation; it does not use up the daily limit."""
+    try:
+        async with SessionLocal() as session:
+            session.add(build_generation(user_id, usage, outcome="failed"))
+            await session.commit()
+    except Exception:
+        logger.exception("Failed to record failed generation for user %s", user_id)
+
+
+async def _refund_generations(user_id: int, day, count: int = 1):
+    """Return reserved slots that produced no saved quiz (own session: the request's may be unusable)."""
+    try:
+        async with SessionLocal() as session:
+            await refund_generations(session, user_id, count=count, day=day)
+    except Exception:
+        logger.exception("Failed to refund %d generation(s) for user %s", count, user_id)
 
 @router.post("/quiz", response_model=GeneratedQuizResponse)
 async def generate_quiz_endpoint(
@@ -43,27 +139,55 @@ async def generate_quiz_endpoint(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    try:
-        # Count today's generations for the user
-        today = datetime.now(timezone.utc).date()
-        today_start = datetime.combine(today, datetime.min.time())
-        q = select(func.count(Generation.id)).where(
-            Generation.user_id == current_user.id,
-            Generation.created_at >= today_start,
-        )
-        result = await db.execute(q)
-        used = result.scalar() or 0
-
-        if used >= DAILY_GENERATION_LIMIT:
-            raise HTTPException(status_code=429, detail="Daily generation limit reached")
+    _ensure_upstream_available()
+    user_id = current_user.id
+    day = quota_day()
+    # Reserve the slot before calling the LLM; it is refunded unless a quiz is saved
+    if not await reserve_generations(db, user_id, day=day):
+        raise HTTPException(status_code=429, detail="Daily generation limit reached")
 
-        # Generate quiz content
-        quiz_data = await generate_quiz_content(
-            quiz_request.topic,
-            quiz_request.difficulty,
-            quiz_request.language,
-        )
-        questions = quiz_data["quiz"]["questions"]
+    usage = None
+    charged = False
+    try:
+        # Serve a pre-generated quiz for trending topics when the user has not
+        # received it yet, otherwise generate (possibly from the generation
+        # cache); both are charged against the daily limit like live calls
+        with track_usage() as usage:
+            questions = await warm_pool.take(
+                db,
+                user_id,
+                quiz_request.topic,
+                quiz_request.difficulty,
+                quiz_request.language,
+                quiz_request.questions_count,
+            )
+            if questions is None:
+                quiz_data = await generate_quiz_content(
+                    quiz_request.topic,
+                    quiz_request.difficulty,
+                    quiz_request.language,
+                    quiz_request.questions_count,
+                )
+                questions = quiz_data.get("quiz", {}).get("questions")
+                if "error" in quiz_data:
+                    questions = None
+            if questions:
+                # Don't hand a user questions they already have in another quiz
+                questions = await replace_known_duplicates(
+                    db,
+                    user_id,
+                    quiz_request.topic,
+                    quiz_request.difficulty,
+                    quiz_request.language,
+                    questions,
+                )
+        if not questions:
+            # Nothing usable survived validation/repair; the slot is refunded
+            await _record_failed_generation(user_id, usage)
+            raise HTTPException(
+                status_code=502,
+                detail="Quiz generation failed. Please try again later.",
+            )
 
         # Persist quiz immediately (private by default)
         saved = await save_generated_quiz(
@@ -72,14 +196,14 @@ async def generate_quiz_endpoint(
             language=quiz_request.language,
             questions=questions,
             db=db,
-            owner_id=current_user.id,
+            owner_id=user_id,
             is_public=False,
         )
 
-        # Log the generation event
-        gen = Generation(user_id=current_user.id)
-        db.add(gen)
+        # Log the generation event with its token/latency accounting
+        db.add(build_generation(user_id, usage))
         await db.commit()
+        charged = True
 
         return {
             "id": saved.id,
@@ -90,23 +214,311 @@ async def generate_quiz_endpoint(
         }
     except HTTPException:
         raise
+    except CircuitOpenError as exc:
+        raise _upstream_unavailable(exc.retry_after)
+    except asyncio.TimeoutError:
+        logger.warning("Quiz generation timed out for user %s", user_id)
+        await _record_failed_generation(user_id, usage)
+        raise HTTPException(
+            status_code=504,
+            detail="Quiz generation timed out. Please try again later.",
+        )
     except Exception as e:
         logger.exception("Quiz generation failed")
+        if usage is not None and usage.upstream_calls:
+            await _record_failed_generation(user_id, usage)
         raise HTTPException(
             status_code=500,
             detail="Quiz generation failed. Please try again later.",
         )
+    finally:
+        if not charged:
+            await _refund_generations(user_id, day)
 
-@router.get('/remaining')
-async def get_remaining_generations(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    # Count today's generations for the user
-    today = datetime.now(timezone.utc).date()
-    today_start = datetime.combine(today, datetime.min.time())
-    q = select(func.count(Generation.id)).where(
-        Generation.user_id == current_user.id,
-        Generation.created_at >= today_start,
+@router.post("/quiz/stream")
+async def stream_quiz_endpoint(
+    quiz_request: QuizRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream generated questions as Server-Sent Events.
+
+    Emits one ``question`` event per parsed question, then a ``done`` event with
+    the saved quiz id, or an ``error`` event if generation failed.
+    """
+    _ensure_upstream_available()
+    user_id = current_user.id
+    day = quota_day()
+    if not await reserve_generations(db, user_id, day=day):
+        raise HTTPException(status_code=429, detail="Daily generation limit reached")
+
+    async def event_stream():
+        questions = []
+        usage = None
+        charged = False
+        try:
+            with track_usage() as usage:
+                async for question in stream_quiz_content(
+                    quiz_request.topic,
+                    quiz_request.difficulty,
+                    quiz_request.language,
+                    quiz_request.questions_count,
+                ):
+                    questions.append(question)
+                    yield _sse_event("question", {"index": len(questions) - 1, "question": question})
+
+            if not questions:
+                await _record_failed_generation(user_id, usage)
+                yield _sse_event("error", {"detail": "Quiz generation failed. Please try again later."})
+                return
+
+            # The request-scoped session may already be closed once streaming
+            # starts, so persist with a dedicated session.
+            async with SessionLocal() as session:
+                saved = await save_generated_quiz(
+                    topic=quiz_request.topic,
+                    difficulty=quiz_request.difficulty,
+                    language=quiz_request.language,
+                    questions=questions,
+                    db=session,
+                    owner_id=user_id,
+                    is_public=False,
+                )
+                session.add(build_generation(user_id, usage))
+                await session.commit()
+            charged = True
+
+            yield _sse_event("done", {
+                "id": saved.id,
+                "title": saved.title,
+                "language": saved.language,
+                "difficulty": saved.difficulty,
+                "questions_count": len(questions),
+            })
+        except Exception:
+            logger.exception("Streaming quiz generation failed")
+            if usage is not None and usage.upstream_calls and not questions:
+                await _record_failed_generation(user_id, usage)
+            yield _sse_event("error", {"detail": "Quiz generation failed. Please try again later."})
+        finally:
+            # Also runs when the client disconnects mid-stream
+            if not charged:
+                await _refund_generations(user_id, day)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    result = await db.execute(q)
-    used = result.scalar() or 0
 
-    return {"remaining": max(0, DAILY_GENERATION_LIMIT - used)}
\ No newline at end of file
+@router.post("/batch", response_model=BatchQuizResponse)
+async def generate_quiz_batch(
+    batch: BatchQuizRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Generate several quizzes concurrently and save the successful ones together.
+
+    Items beyond the user's remaining daily quota are reported as failed instead
+    of failing the whole batch.
+    """
+    limit_error = "Daily generation limit reached"
+    user_id = current_user.id
+    requests = batch.requests
+    _ensure_upstream_available()
+    # Reserve as many slots as the quota allows up front (this also ends the
+    # transaction, so no connection is held during generation); slots of items
+    # that fail are refunded afterwards.
+    day = quota_day()
+    granted = await reserve_generations(db, user_id, count=len(requests), day=day)
+    if granted == 0:
+        raise HTTPException(status_code=429, detail=limit_error)
+
+    results: List[Optional[BatchQuizItemResult]] = [None] * len(requests)
+    failed_usages = []
+    semaphore = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+
+    async def generate_one(index: int, quiz_request: QuizRequest):
+        async with semaphore:
+            # Each item is accounted separately; gather runs it in its own task
+            with track_usage() as usage:
+                try:
+                    quiz_data = await generate_quiz_content(
+                        quiz_request.topic,
+                        quiz_request.difficulty,
+                        quiz_request.language,
+                        quiz_request.questions_count,
+                    )
+                    if "error" in quiz_data:
+                        raise RuntimeError(f"Generation returned no quiz: {quiz_data['error']}")
+                    # Items run concurrently, so each uses its own session
+                    # rather than the request's
+                    async with SessionLocal() as session:
+                        questions = await replace_known_duplicates(
+                            session,
+                            user_id,
+                            quiz_request.topic,
+                            quiz_request.difficulty,
+                            quiz_request.language,
+                            quiz_data["quiz"]["questions"],
+                        )
+                    return index, questions, usage
+                except CircuitOpenError:
+                    results[index] = BatchQuizItemResult(
+                        index=index, status="failed", error="Quiz generation is temporarily unavailable."
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("Batch item %d timed out for user %s", index, user_id)
+                    results[index] = BatchQuizItemResult(index=index, status="failed", error="Quiz generation timed out.")
+                except Exception:
+                    logger.exception("Batch item %d failed for user %s", index, user_id)
+                    results[index] = BatchQuizItemResult(index=index, status="failed", error="Quiz generation failed.")
+            if usage.upstream_calls:
+                failed_usages.append(usage)
+            return index, None, usage
+
+    for index in range(granted, len(requests)):
+        results[index] = BatchQuizItemResult(index=index, status="failed", error=limit_error)
+
+    generated = await asyncio.gather(
+        *(generate_one(index, requests[index]) for index in range(granted))
+    )
+    accepted = [(index, questions, usage) for index, questions, usage in generated if questions]
+
+    try:
+        # Persist every generated quiz in one transaction
+        saved = await create_quizzes(db, [
+            build_generated_quiz_data(
+                topic=requests[index].topic,
+                difficulty=requests[index].difficulty,
+                language=requests[index].language,
+                questions=questions,
+                owner_id=user_id,
+                is_public=False,
+            )
+            for index, questions, _ in accepted
+        ])
+        db.add_all([build_generation(user_id, usage) for _, _, usage in accepted])
+        db.add_all([build_generation(user_id, usage, outcome="failed") for usage in failed_usages])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        logger.exception("Failed to save batch generation for user %s", user_id)
+        await _refund_generations(user_id, day, count=granted)
+        raise HTTPException(
+            status_code=500,
+            detail="Quiz generation failed. Please try again later.",
+        )
+
+    await refund_generations(db, user_id, count=granted - len(accepted), day=day)
+
+    for (index, questions, _), quiz in zip(accepted, saved):
+        results[index] = BatchQuizItemResult(
+            index=index,
+            status="succeeded",
+            quiz=GeneratedQuizResponse(
+                id=quiz.id,
+                title=quiz.title,
+                language=quiz.language,
+                difficulty=quiz.difficulty,
+                questions=questions,
+            ),
+        )
+
+    succeeded = len(accepted)
+    return BatchQuizResponse(
+        results=results,
+        succeeded=succeeded,
+        failed=len(requests) - succeeded,
+        remaining=await remaining_generations(db, user_id),
+    )
+
+@router.post("/jobs", response_model=GenerationJobResponse, status_code=202)
+async def enqueue_generation_job(
+    quiz_request: QuizRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Queue a quiz generation to run in the background; poll GET /generate/jobs/{id}."""
+    # The slot is reserved now and refunded by the worker if the job fails
+    if not await reserve_generations(db, current_user.id):
+        raise HTTPException(status_code=429, detail="Daily generation limit reached")
+
+    job = await create_generation_job(
+        db,
+        user_id=current_user.id,
+        topic=quiz_request.topic,
+        difficulty=quiz_request.difficulty,
+        language=quiz_request.language,
+        questions_count=quiz_request.questions_count,
+    )
+    generation_job_queue.notify(job.id)
+    return GenerationJobResponse.model_validate(job, from_attributes=True)
+
+@router.get("/jobs/{job_id}", response_model=GenerationJobResponse)
+async def get_generation_job_status(
+    job_id: int,
+    claims: TokenClaims = Depends(get_token_claims),
+    db: AsyncSession = Depends(get_db)
+):
+    job = await get_generation_job(db, job_id)
+    if not job or job.user_id != claims.user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    response = GenerationJobResponse.model_validate(job, from_attributes=True)
+    if job.status == "succeeded" and job.quiz_id:
+        quiz = await get_quiz(db, job.quiz_id)
+        if quiz:
+            response.result = GeneratedQuizResponse(
+                id=quiz.id,
+                title=quiz.title,
+                language=quiz.language,
+                difficulty=quiz.difficulty,
+                questions=quiz.questions,
+            )
+    return response
+
+@router.get('/remaining')
+async def get_remaining_generations(claims: TokenClaims = Depends(get_token_claims), db: AsyncSession = Depends(get_db)):
+    return {"remaining": await remaining_generations(db, claims.user_id)}
+
+@router.get("/stats")
+async def get_generation_stats(admin: User = Depends(get_admin_user)):
+    """Process-local counters for the generation cache, validation/repair and upstream calls."""
+    return {
+        "cache": generation_cache.stats(),
+        "pipeline": dict(mistral_service.metrics),
+        "circuit_breaker": mistral_service.breaker.stats(),
+        "warm_pool": warm_pool.stats(),
+    }
+
+@router.get("/usage")
+async def get_generation_usage(
+    days: int = Query(7, ge=1, le=90),
+    group_by: Literal["day", "user", "model"] = "day",
+    all_users: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Token, cost and latency accounting of recorded generations.
+
+    Scoped to the current user; emails listed in USAGE_ADMIN_EMAILS may pass
+    ``all_users=true`` to aggregate across every account.
+    """
+    if all_users and current_user.email.lower() not in USAGE_ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Not allowed to read usage of other users")
+
+    since = datetime.utcnow() - timedelta(days=days)
+    user_id = None if all_users else current_user.id
+    # Aggregated in the database: the response size is bounded by the number
+    # of groups, however many generations the window holds
+    rows = await aggregate_generation_usage(db, since, group_by, user_id=user_id)
+    latencies = await generation_latency_percentiles(db, since, group_by, user_id=user_id)
+    groups = summarize_usage(rows, latencies)
+    return {
+        "days": days,
+        "group_by": group_by,
+        "generations": sum(group["generations"] for group in groups),
+        "estimated_cost": round(sum(group["estimated_cost"] for group in groups), 6),
+        "groups": groups,
+    }
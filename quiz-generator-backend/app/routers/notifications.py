@@ -3,7 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from database.database import get_db
 from database.models import User
-from app.routers.auth import get_current_user
+from app.routers.auth import TokenClaims, get_current_user, get_token_claims
 from crud.notification_crud import list_notifications, mark_read, mark_all_read, count_unread
 from schemas.notification import NotificationResponse, UnreadCountResponse
 
@@ -12,19 +12,19 @@ router = APIRouter(prefix="/notifications", tags=["notifications"])
 @router.get("/", response_model=List[NotificationResponse])
 async def get_notifications(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    claims: TokenClaims = Depends(get_token_claims),
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100)
 ):
-    notifs = await list_notifications(db, current_user.id, limit=limit, offset=offset)
+    notifs = await list_notifications(db, claims.user_id, limit=limit, offset=offset)
     return [NotificationResponse.model_validate(n) for n in notifs]
 
 @router.get("/unread", response_model=UnreadCountResponse)
 async def get_unread_count(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    claims: TokenClaims = Depends(get_token_claims)
 ):
-    count = await count_unread(db, current_user.id)
+    count = await count_unread(db, claims.user_id)
     return UnreadCountResponse(unread=count)
 
 @router.post("/{notification_id}/read", response_model=NotificationResponse)
@@ -1,23 +1,115 @@
+import json
 import logging
-from typing import List
+from datetime import datetime, timezone
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, func, case
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.routers.auth import get_current_user
-from crud.quiz_crud import create_quiz, get_quiz, get_all_quizzes, update_quiz, delete_quiz
-from database.database import get_db
-from database.models import User, Quiz, UserScore
-from schemas.quiz import QuizCreate, QuizResponse, QuizUpdate
+from app.routers.auth import TokenClaims, get_current_user, get_optional_token_claims, get_token_claims
+from app.services.conditional_requests import etag_matches, quiz_cache_control, quiz_etag
+from app.services.global_stats import global_stats_cache
+from app.services.pagination import InvalidCursor, decode_cursor, encode_cursor
+from app.services.question_index import duplicate_clusters
+from crud.quiz_crud import (
+    create_quiz,
+    delete_quiz,
+    get_quiz,
+    get_quiz_version,
+    list_quiz_summaries,
+    quiz_filters,
+    stream_quiz_rows,
+    update_quiz,
+)
+from crud.leaderboard_crud import (
+    ALL_TIME,
+    get_leaderboard_entry,
+    get_leaderboard_rank,
+    list_leaderboard,
+    week_period,
+)
+from crud.quiz_search_crud import search_matches
+from crud.quiz_stats_crud import average_score, get_quiz_attempts, get_quiz_stats_map
+from database.database import SessionLocal, get_db
+from database.models import User, Quiz, QuizStats
+from schemas.quiz import QuizCreate, QuizResponse, QuizSummaryResponse, QuizUpdate
 
 router = APIRouter(prefix="/quizzes", tags=["quizzes"])
 logger = logging.getLogger(__name__)
 
 
-@router.get("/", response_model=List[QuizResponse])
-async def fetch_all_quizzes(db: AsyncSession = Depends(get_db)):
-    return await get_all_quizzes(db)
+# Columns available to the NDJSON export's ``fields`` projection
+EXPORT_FIELDS = {
+    "id": Quiz.id,
+    "title": Quiz.title,
+    "description": Quiz.description,
+    "language": Quiz.language,
+    "difficulty": Quiz.difficulty,
+    "questions": Quiz.questions,
+    "questions_count": Quiz.questions_count,
+    "owner_id": Quiz.owner_id,
+    "is_public": Quiz.is_public,
+    "created_at": Quiz.created_at,
+    "updated_at": Quiz.updated_at,
+}
+DEFAULT_EXPORT_FIELDS = "id,title,description,language,difficulty,questions,created_at,is_public"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def _export_ndjson(columns: list, conditions: list):
+    # The request's session is closed once the handler returns, so the stream owns its own
+    async with SessionLocal() as db:
+        async for row in stream_quiz_rows(db, columns, conditions):
+            yield json.dumps(dict(row._mapping), default=_json_default) + "\n"
+
+
+@router.get("/", response_model=List[QuizSummaryResponse])
+async def fetch_all_quizzes(
+    difficulty: Optional[str] = None,
+    language: Optional[str] = None,
+    is_public: Optional[bool] = None,
+    owner_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    fields: Optional[str] = None,
+    claims: Optional[TokenClaims] = Depends(get_optional_token_claims),
+    db: AsyncSession = Depends(get_db),
+):
+    """List quizzes in id order.
+
+    Public quizzes are listed for everyone; private ones only to their owner.
+    The JSON response holds summaries (no questions) of at most ``limit``
+    quizzes; continue with ``after_id`` set to the last id. ``format=ndjson``
+    streams every matching quiz as one JSON object per line instead,
+    questions included, restricted to the comma-separated ``fields`` if given.
+    """
+    conditions = quiz_filters(difficulty, language, is_public, owner_id, after_id)
+    if claims is None:
+        conditions.append(Quiz.is_public == True)
+    else:
+        conditions.append(or_(Quiz.is_public == True, Quiz.owner_id == claims.user_id))
+    if format == "json":
+        if fields is not None:
+            raise HTTPException(status_code=400, detail="fields is only supported with format=ndjson")
+        return await list_quiz_summaries(db, conditions, limit=limit)
+
+    names = [name.strip() for name in (fields or DEFAULT_EXPORT_FIELDS).split(",") if name.strip()]
+    unknown = [name for name in names if name not in EXPORT_FIELDS]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields selected",
+        )
+    columns = [EXPORT_FIELDS[name].label(name) for name in dict.fromkeys(names)]
+    return StreamingResponse(_export_ndjson(columns, conditions), media_type="application/x-ndjson")
 
 
 @router.post("/", response_model=QuizResponse)
@@ -32,76 +124,74 @@ async def create_quiz_endpoint(
     quiz_data["owner_id"] = current_user.id
     return await create_quiz(db, quiz_data)
 
+async def _global_stats_snapshot(response: Response) -> dict:
+    snapshot, age = await global_stats_cache.get()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Statistics are temporarily unavailable")
+    response.headers["Age"] = str(int(age))
+    return snapshot
+
 @router.get("/count")
-async def get_quiz_count(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(func.count(Quiz.id)))
-    return {"count": result.scalar()}
+async def get_quiz_count(response: Response):
+    snapshot = await _global_stats_snapshot(response)
+    return {"count": snapshot["totalQuizzes"]}
 
 @router.get("/stats/global")
-async def get_global_stats(db: AsyncSession = Depends(get_db)):
-    """Get global platform statistics"""
-    quiz_count = await db.execute(select(func.count(Quiz.id)))
-    total_quizzes = quiz_count.scalar()
-
-    # Total users
-    user_count = await db.execute(select(func.count(User.id)))
-    total_users = user_count.scalar()
-
-    # Average score
-    score_avg = await db.execute(
-        select(func.avg(UserScore.score * 100 / UserScore.max_score)).where(UserScore.max_score > 0)
-    )
-    avg_score = int(score_avg.scalar() or 0)
-
-    # Most popular topic (most attempted quiz title)
-    popular_topic = await db.execute(
-        select(Quiz.title, func.count(UserScore.id).label("attempts"))
-        .join(UserScore, Quiz.id == UserScore.quiz_id)
-        .group_by(Quiz.title)
-        .order_by(func.count(UserScore.id).desc())
-        .limit(1)
-    )
-
-    top_topic = popular_topic.first()
-    popular_topic_name = top_topic.title if top_topic else "JavaScript Fundamentals"
+async def get_global_stats(response: Response):
+    """Get global platform statistics (a periodically refreshed snapshot; see Age)"""
+    snapshot = await _global_stats_snapshot(response)
+    return {**snapshot, "snapshotAge": int(response.headers["Age"])}
 
+# Leaderboard endpoints
+def _leaderboard_period(period: str) -> str:
+    if period == "week":
+        return week_period(datetime.now(timezone.utc))
+    if period == "all":
+        return ALL_TIME
+    raise HTTPException(status_code=400, detail="period must be 'all' or 'week'")
+
+def _leaderboard_row(entry) -> dict:
     return {
-        "totalQuizzes": total_quizzes,
-        "totalUsers": total_users,
-        "avgScore": avg_score,
-        "topicOfTheWeek": popular_topic_name,
+        "score": entry.best_score,
+        "avgScore": int(entry.score_sum / entry.attempts) if entry.attempts else 0,
+        "totalQuizzes": entry.attempts,
     }
 
-# Leaderboard endpoints
 @router.get("/leaderboard/{difficulty}")
-async def get_leaderboard_by_difficulty(difficulty: str, db: AsyncSession = Depends(get_db)):
-    """Get top performers by difficulty level"""
-    result = await db.execute(
-        select(
-            User.username,
-            func.max(UserScore.score).label('best_score'),
-            func.avg(UserScore.score).label('avg_score'),
-            func.count(UserScore.id).label('total_quizzes'),
-            UserScore.max_score
-        )
-        .join(UserScore, User.id == UserScore.user_id)
-        .join(Quiz, UserScore.quiz_id == Quiz.id)
-        .where(Quiz.difficulty == difficulty)
-        .group_by(User.username, UserScore.max_score)
-        .order_by(func.max(UserScore.score).desc())
-        .limit(10)
-    )
-
-    leaderboard = []
-    for row in result:
-        leaderboard.append({
-            "username": row.username,
-            "score": int((row.best_score / row.max_score) * 100) if row.max_score else 0,
-            "avgScore": int((row.avg_score / row.max_score) * 100) if row.max_score else 0,
-            "totalQuizzes": row.total_quizzes
-        })
+async def get_leaderboard_by_difficulty(
+    difficulty: str,
+    period: str = "all",
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get top performers by difficulty level, all-time or for the current (ISO) week"""
+    rows = await list_leaderboard(db, difficulty, _leaderboard_period(period), limit)
+    return [{"username": username, **_leaderboard_row(entry)} for entry, username in rows]
+
+@router.get("/leaderboard/{difficulty}/me")
+async def get_my_leaderboard_rank(
+    difficulty: str,
+    period: str = "all",
+    db: AsyncSession = Depends(get_db),
+    claims: TokenClaims = Depends(get_token_claims),
+):
+    """The caller's 1-based rank on a leaderboard (null if they have no attempts there)"""
+    entry = await get_leaderboard_entry(db, difficulty, _leaderboard_period(period), claims.user_id)
+    if entry is None:
+        return {"rank": None, "score": 0, "avgScore": 0, "totalQuizzes": 0}
+    return {"rank": await get_leaderboard_rank(db, entry), **_leaderboard_row(entry)}
+
+def _keyset_after(sort_key, descending: bool, nullable: bool, value, quiz_id: int):
+    """Rows after (value, quiz_id) in ORDER BY sort_key [DESC] NULLS LAST, id [DESC]."""
+    tie = Quiz.id < quiz_id if descending else Quiz.id > quiz_id
+    if value is None:
+        return and_(sort_key.is_(None), tie)
+    beyond = sort_key < value if descending else sort_key > value
+    condition = or_(beyond, and_(sort_key == value, tie))
+    if nullable:
+        condition = or_(condition, sort_key.is_(None))
+    return condition
 
-    return leaderboard
 
 # Browse quizzes with filtering
 @router.get("/browse/public")
@@ -109,18 +199,29 @@ async def browse_public_quizzes(
     search: str = None,
     difficulty: str = None,
     language: str = None,
-    sort_by: str = "created",
+    sort_by: str = None,
+    search_questions: bool = False,
     page: int = 1,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
 ):
-    """Browse public quizzes with filtering and pagination"""
+    """Browse public quizzes with filtering and pagination.
+
+    ``search`` uses the full-text index (title and description, plus question
+    text with ``search_questions``); results are ranked by relevance unless
+    another ``sort_by`` is given.
+
+    Passing ``cursor`` (empty for the first page) switches from page numbers to
+    keyset pagination: the response becomes ``{"items": [...], "next_cursor": ...}``
+    and pages stay stable while new quizzes are published.
+    """
     query = select(
         Quiz.id.label("quiz_id"),
         Quiz.title.label("title"),
         Quiz.description.label("description"),
         Quiz.language.label("language"),
-        Quiz.questions.label("questions"),
+        Quiz.questions_count.label("questions_count"),
         Quiz.difficulty.label("difficulty"),
         Quiz.owner_id.label("owner_id"),
         Quiz.is_public.label("is_public"),
@@ -130,66 +231,85 @@ async def browse_public_quizzes(
 
     query = query.where(Quiz.is_public == True)
 
+    dialect = db.bind.dialect.name
+    matches = None
     if search:
-        il = f"%{search}%"
-        query = query.where((Quiz.title.ilike(il)) | (Quiz.description.ilike(il)))
+        matches = search_matches(
+            dialect,
+            search,
+            language=language if language != "all" else None,
+            include_questions=search_questions,
+        )
+        if matches is not None:
+            query = query.join(matches, matches.c.quiz_id == Quiz.id)
     if difficulty and difficulty != "all":
         query = query.where(Quiz.difficulty == difficulty)
     if language and language != "all":
         query = query.where(Quiz.language == language)
 
-    if sort_by == "popular":
-        attempts_subq = (
-            select(
-                UserScore.quiz_id.label("quiz_id"),
-                func.count(UserScore.id).label("attempts"),
-            )
-            .group_by(UserScore.quiz_id)
-        ).subquery()
-        query = query.outerjoin(attempts_subq, Quiz.id == attempts_subq.c.quiz_id).order_by(
-            attempts_subq.c.attempts.desc().nullslast()
-        )
+    if sort_by is None or (sort_by == "relevance" and matches is None):
+        sort_by = "relevance" if matches is not None else "created"
+
+    # Every mode orders by (key, id) so that keyset positions are unambiguous
+    nullable = False
+    if sort_by == "relevance":
+        sort_key, descending = matches.c.rank, True
+    elif sort_by == "popular":
+        query = query.outerjoin(QuizStats, Quiz.id == QuizStats.quiz_id)
+        sort_key, descending = func.coalesce(QuizStats.attempts, 0), True
     elif sort_by == "difficulty":
-        query = query.order_by(Quiz.difficulty.asc())
+        sort_key, descending, nullable = Quiz.difficulty, False, True
     else:
-        query = query.order_by(Quiz.created_at.desc())
+        sort_by = "created"
+        sort_key, descending = Quiz.created_at, True
+        if dialect == "sqlite":
+            # SQLite keeps timestamps as text of varying precision; compare a normalized form
+            sort_key = func.strftime("%Y-%m-%d %H:%M:%f", Quiz.created_at)
+
+    query = query.add_columns(sort_key.label("sort_key"))
+    if descending:
+        query = query.order_by(sort_key.desc(), Quiz.id.desc())
+    else:
+        query = query.order_by(sort_key.asc().nullslast(), Quiz.id.asc())
 
-    offset = (page - 1) * limit
-    query = query.offset(offset).limit(limit)
+    if cursor is None:
+        offset = (page - 1) * limit
+        query = query.offset(offset).limit(limit)
+    else:
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+                if position.get("sort") != sort_by:
+                    raise InvalidCursor("Cursor belongs to another sort order")
+                value = position["key"]
+                if sort_by == "created" and dialect != "sqlite" and value is not None:
+                    value = datetime.fromisoformat(value)
+                quiz_id = int(position["id"])
+            except (InvalidCursor, AttributeError, KeyError, TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = query.where(_keyset_after(sort_key, descending, nullable, value, quiz_id))
+        # One extra row tells whether another page exists
+        query = query.limit(limit + 1)
 
     result = await db.execute(query)
     quiz_rows = result.mappings().all()
 
-    # Batch-fetch stats for all quiz IDs to avoid N+1 queries
-    quiz_ids = [row.get("quiz_id") for row in quiz_rows]
-    stats_map = {}
-    if quiz_ids:
-        stats_result = await db.execute(
-            select(
-                UserScore.quiz_id,
-                func.count(UserScore.id).label("attempts"),
-                func.avg(
-                    case(
-                        (UserScore.max_score > 0, UserScore.score * 100 / UserScore.max_score),
-                        else_=0,
-                    )
-                ).label("avg_score"),
-            )
-            .where(UserScore.quiz_id.in_(quiz_ids))
-            .group_by(UserScore.quiz_id)
-        )
-        for row in stats_result.mappings().all():
-            stats_map[row["quiz_id"]] = {
-                "attempts": int(row["attempts"] or 0),
-                "avg_score": int(row["avg_score"] or 0),
-            }
+    next_cursor = None
+    if cursor is not None and len(quiz_rows) > limit:
+        quiz_rows = quiz_rows[:limit]
+        last = quiz_rows[-1]
+        sort_value = last["sort_key"]
+        if isinstance(sort_value, datetime):
+            sort_value = sort_value.isoformat()
+        next_cursor = encode_cursor({"sort": sort_by, "key": sort_value, "id": last["quiz_id"]})
+
+    stats_map = await get_quiz_stats_map(db, [row.get("quiz_id") for row in quiz_rows])
 
     enhanced_quizzes = []
     for row in quiz_rows:
         quiz_id = row.get("quiz_id")
         creator_name = row.get("username") or "Anonymous"
-        questions = row.get("questions") or []
-        stats = stats_map.get(quiz_id, {"attempts": 0, "avg_score": 0})
+        stats = stats_map.get(quiz_id)
 
         enhanced_quizzes.append(
             {
@@ -198,9 +318,9 @@ async def browse_public_quizzes(
                 "description": row.get("description"),
                 "difficulty": row.get("difficulty"),
                 "language": row.get("language"),
-                "questionsCount": len(questions),
-                "attempts": stats["attempts"],
-                "avgScore": stats["avg_score"],
+                "questionsCount": row.get("questions_count") or 0,
+                "attempts": stats.attempts if stats else 0,
+                "avgScore": average_score(stats),
                 "creator": creator_name,
                 "created": row.get("created_at"),
                 "tags": [],
@@ -208,37 +328,55 @@ async def browse_public_quizzes(
             }
         )
 
+    if cursor is not None:
+        return {"items": enhanced_quizzes, "next_cursor": next_cursor}
     return enhanced_quizzes
 
-@router.get("/user/created")
+@router.get("/user/created", response_model=List[QuizSummaryResponse])
 async def get_user_created_quizzes(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get quizzes created by the current user"""
-    result = await db.execute(
-        select(Quiz)
-        .where(Quiz.owner_id == current_user.id)
-        .order_by(Quiz.created_at.desc())
+    return await list_quiz_summaries(
+        db,
+        [Quiz.owner_id == current_user.id],
+        order_by=(Quiz.created_at.desc(), Quiz.id.desc()),
     )
-    quizzes = result.scalars().all()
-    return [{
-        "id": q.id,
-        "title": q.title,
-        "description": q.description,
-        "difficulty": q.difficulty,
-        "language": q.language,
-        "questions": q.questions,
-        "is_public": q.is_public,
-        "created_at": q.created_at
-    } for q in quizzes]
+
+@router.get("/user/duplicates")
+async def get_user_duplicate_questions(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Clusters of near-identical questions across the current user's quizzes"""
+    clusters = await duplicate_clusters(db, current_user.id)
+    return {"clusters": clusters, "count": len(clusters)}
 
 # Parameterized routes MUST come after all static routes
 @router.get("/{quiz_id}", response_model=QuizResponse)
-async def get_single_quiz(quiz_id: int, db: AsyncSession = Depends(get_db)):
+async def get_single_quiz(
+    quiz_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    # Revalidation only needs updated_at; the questions are loaded on a miss
+    version = await get_quiz_version(db, quiz_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    headers = {
+        "ETag": quiz_etag(version.id, version.updated_at),
+        "Cache-Control": quiz_cache_control(version.is_public),
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
     quiz = await get_quiz(db, quiz_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
+    response.headers["ETag"] = quiz_etag(quiz.id, quiz.updated_at)
+    response.headers["Cache-Control"] = quiz_cache_control(quiz.is_public)
     return quiz
 
 @router.put("/{quiz_id}", response_model=QuizResponse)
@@ -261,12 +399,8 @@ async def update_quiz_endpoint(
     return updated_quiz
 
 @router.get("/{quiz_id}/scores/count")
-async def get_quiz_attempts(quiz_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(func.count(UserScore.id))
-        .where(UserScore.quiz_id == quiz_id)
-    )
-    return {"attempts": result.scalar()}
+async def get_quiz_attempts_count(quiz_id: int, db: AsyncSession = Depends(get_db)):
+    return {"attempts": await get_quiz_attempts(db, quiz_id)}
 
 @router.delete("/{quiz_id}")
 async def delete_quiz_endpoint(
@@ -0,0 +1,138 @@
+import logging
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import select, text, update
+
+from crud.leaderboard_crud import refresh_user_leaderboards
+from crud.quiz_search_crud import reindex_quizzes, search_index_is_empty
+from crud.quiz_stats_crud import refresh_quiz_stats
+from database.database import SessionLocal, engine
+from database.models import LeaderboardEntry, Quiz, QuizStats, User, UserScore
+
+logger = logging.getLogger(__name__)
+
+QUIZ_BATCH_SIZE = 500
+USER_BATCH_SIZE = 200
+
+# Arbitrary key of the PostgreSQL advisory lock that keeps several starting
+# worker processes from backfilling the same table at once
+_BACKFILL_LOCK_KEY = 7301920
+
+
+async def _for_each_id_batch(column, batch_size: int, handle: Callable[..., Awaitable[None]]) -> int:
+    """Call ``handle(db, ids)`` for ascending batches of ``column``, committing each."""
+    processed = 0
+    last_id = 0
+    while True:
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(column).where(column > last_id).order_by(column).limit(batch_size)
+            )
+            ids: List[int] = result.scalars().all()
+            if not ids:
+                return processed
+            await handle(db, ids)
+            await db.commit()
+        processed += len(ids)
+        last_id = ids[-1]
+        logger.info("Backfill progress: %d %s row(s) processed", processed, column.table.name)
+
+
+async def rebuild_quiz_stats() -> int:
+    """Recompute quiz_stats from user_scores for every quiz; returns quizzes processed."""
+    return await _for_each_id_batch(Quiz.id, QUIZ_BATCH_SIZE, refresh_quiz_stats)
+
+
+async def rebuild_quiz_search() -> int:
+    """Re-index every quiz for full-text search; returns quizzes processed."""
+    return await _for_each_id_batch(Quiz.id, QUIZ_BATCH_SIZE, reindex_quizzes)
+
+
+async def rebuild_leaderboards() -> int:
+    """Recompute every user's leaderboard entries from user_scores; returns users processed."""
+    return await _for_each_id_batch(User.id, USER_BATCH_SIZE, refresh_user_leaderboards)
+
+
+async def backfill_questions_count() -> int:
+    """Set questions_count on quizzes saved before the column existed; returns quizzes updated."""
+    updated = 0
+    last_id = 0
+    while True:
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(Quiz.id, Quiz.questions)
+                .where(Quiz.questions_count == 0, Quiz.id > last_id)
+                .order_by(Quiz.id)
+                .limit(QUIZ_BATCH_SIZE)
+            )
+            rows = result.all()
+            if not rows:
+                return updated
+            for row in rows:
+                if isinstance(row.questions, list) and row.questions:
+                    await db.execute(
+                        update(Quiz)
+                        .where(Quiz.id == row.id)
+                        .values(questions_count=len(row.questions))
+                        .execution_options(synchronize_session=False)
+                    )
+                    updated += 1
+            await db.commit()
+        last_id = rows[-1].id
+
+
+async def _is_empty(db, table) -> bool:
+    result = await db.execute(select(text("1")).select_from(table).limit(1))
+    return result.first() is None
+
+
+async def _quiz_stats_missing(db) -> bool:
+    return await _is_empty(db, QuizStats.__table__) and not await _is_empty(db, UserScore.__table__)
+
+
+async def _quiz_search_missing(db) -> bool:
+    return await search_index_is_empty(db) and not await _is_empty(db, Quiz.__table__)
+
+
+async def _leaderboards_missing(db) -> bool:
+    return await _is_empty(db, LeaderboardEntry.__table__) and not await _is_empty(db, UserScore.__table__)
+
+
+async def _questions_count_missing(db) -> bool:
+    # Quizzes that really have no questions keep 0 and are re-checked on each start
+    result = await db.execute(select(Quiz.id).where(Quiz.questions_count == 0).limit(1))
+    return result.first() is not None
+
+
+# (name, needs backfill?, rebuild) for the data derived from other data
+_BACKFILLS = (
+    ("quizzes.questions_count", _questions_count_missing, backfill_questions_count),
+    ("quiz_stats", _quiz_stats_missing, rebuild_quiz_stats),
+    ("quiz_search", _quiz_search_missing, rebuild_quiz_search),
+    ("leaderboard_entries", _leaderboards_missing, rebuild_leaderboards),
+)
+
+
+async def backfill_derived_tables():
+    """Populate derived tables that are empty although their source data is not,
+    and denormalized columns added after their rows were written.
+
+    Runs at startup so a freshly deployed table serves real values right
+    away; afterwards the tables are maintained incrementally.
+    """
+    async with engine.connect() as lock_conn:
+        postgres = lock_conn.dialect.name == "postgresql"
+        if postgres:
+            await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _BACKFILL_LOCK_KEY})
+        try:
+            for name, missing, rebuild in _BACKFILLS:
+                # Checked under the lock: another process may have just filled it
+                async with SessionLocal() as db:
+                    if not await missing(db):
+                        continue
+                logger.info("Backfilling %s", name)
+                processed = await rebuild()
+                logger.info("Backfilled %s (%d row(s))", name, processed)
+        finally:
+            if postgres:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _BACKFILL_LOCK_KEY})
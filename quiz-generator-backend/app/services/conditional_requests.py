@@ -0,0 +1,34 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Optional
+
+# Browser/CDN caching of quiz reads:
+# - QUIZ_CACHE_MAX_AGE_SECONDS: how long public quizzes may be reused without
+#   revalidating; afterwards clients revalidate with If-None-Match and get 304
+#   until the quiz is edited
+QUIZ_CACHE_MAX_AGE_SECONDS = int(os.getenv("QUIZ_CACHE_MAX_AGE_SECONDS", "60"))
+
+
+def quiz_etag(quiz_id: int, updated_at: Optional[datetime]) -> str:
+    """Strong ETag for a quiz representation; changes whenever the quiz is updated."""
+    stamp = updated_at.isoformat() if updated_at else ""
+    digest = hashlib.sha1(f"quiz:{quiz_id}:{stamp}".encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match evaluation (weak comparison, as RFC 9110 requires for it)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def quiz_cache_control(is_public: bool) -> str:
+    if is_public:
+        return f"public, max-age={QUIZ_CACHE_MAX_AGE_SECONDS}, must-revalidate"
+    # Private quizzes may be kept by the browser but are revalidated on every use
+    return "private, no-cache"
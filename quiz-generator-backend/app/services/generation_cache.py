@@ -0,0 +1,134 @@
+import asyncio
+import copy
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Generation cache settings:
+# - GENERATION_CACHE_SIZE: max number of distinct (topic, difficulty, language, count) entries
+# - GENERATION_CACHE_TTL_SECONDS: how long a generated quiz may be reused (0 disables caching)
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "256"))
+GENERATION_CACHE_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_TTL_SECONDS", "3600"))
+
+CacheKey = Tuple[str, str, str, int]
+
+
+def _normalize(value: str) -> str:
+    return " ".join((value or "").split()).casefold()
+
+
+def make_cache_key(topic: str, difficulty: str, language: str, questions_count: int = 5) -> CacheKey:
+    """Normalize a generation request so trivially different spellings share an entry."""
+    return (_normalize(topic), _normalize(difficulty), _normalize(language), questions_count)
+
+
+class GenerationCache:
+    """LRU + TTL cache of generated quizzes with single-flight deduplication.
+
+    Concurrent misses for the same key share one upstream call; the shared call
+    runs in its own task so a disconnecting client does not cancel it for the
+    others. Every caller receives its own deep copy of the result.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = GENERATION_CACHE_SIZE,
+        ttl: float = GENERATION_CACHE_TTL_SECONDS,
+        is_cacheable: Optional[Callable[[dict], bool]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.is_cacheable = is_cacheable or (lambda value: True)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, dict]]" = OrderedDict()
+        self._inflight: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    async def get_or_generate(self, key: CacheKey, factory: Callable[[], Awaitable[dict]]) -> dict:
+        if not self.enabled:
+            return await factory()
+
+        cached = self._get(key)
+        if cached is not None:
+            self.hits += 1
+            return copy.deepcopy(cached)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._on_done(key, t))
+        else:
+            self.coalesced += 1
+
+        value = await asyncio.shield(task)
+        return copy.deepcopy(value)
+
+    def peek(self, key: CacheKey) -> Optional[dict]:
+        """Return a copy of a fresh cached entry without touching in-flight calls."""
+        if not self.enabled:
+            return None
+        cached = self._get(key)
+        if cached is None:
+            return None
+        self.hits += 1
+        return copy.deepcopy(cached)
+
+    def put(self, key: CacheKey, value: dict):
+        if self.enabled and self.is_cacheable(value):
+            self._store(key, copy.deepcopy(value))
+
+    def invalidate(self, key: Optional[CacheKey] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    def _get(self, key: CacheKey) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: CacheKey, value: dict):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _on_done(self, key: CacheKey, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        # Retrieving the exception also marks it as handled for asyncio
+        if task.exception() is not None:
+            return
+        value = task.result()
+        if self.is_cacheable(value):
+            self._store(key, value)
+        else:
+            logger.debug("Not caching unusable generation result for %s", key)
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+from app.services.mistral_service import generate_quiz_content
+from app.services.question_index import replace_known_duplicates
+from app.services.quiz_service import (
+    build_generated_quiz_data,
+    build_generation,
+    refund_generations,
+)
+from app.services.resilience import CircuitOpenError
+from app.services.usage import track_usage
+from crud.generation_job_crud import (
+    claim_generation_job,
+    heartbeat_generation_job,
+    list_pending_job_ids,
+    mark_job_failed,
+    mark_job_succeeded,
+    requeue_stale_jobs,
+)
+from crud.quiz_crud import create_quizzes
+from database.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Background generation worker settings:
+# - GENERATION_JOB_WORKERS: concurrent jobs processed per API process
+# - GENERATION_JOB_POLL_SECONDS: how often idle workers look for jobs enqueued elsewhere
+# - GENERATION_JOB_MAX_ATTEMPTS: attempts before a job is marked failed
+# - GENERATION_JOB_HEARTBEAT_SECONDS: how often a worker marks its running job as alive
+# - GENERATION_JOB_STALE_SECONDS: running jobs without a heartbeat for this long
+#   are assumed orphaned and requeued; keep it several heartbeats long
+GENERATION_JOB_WORKERS = int(os.getenv("GENERATION_JOB_WORKERS", "4"))
+GENERATION_JOB_POLL_SECONDS = float(os.getenv("GENERATION_JOB_POLL_SECONDS", "5"))
+GENERATION_JOB_MAX_ATTEMPTS = int(os.getenv("GENERATION_JOB_MAX_ATTEMPTS", "3"))
+GENERATION_JOB_HEARTBEAT_SECONDS = float(os.getenv("GENERATION_JOB_HEARTBEAT_SECONDS", "15"))
+GENERATION_JOB_STALE_SECONDS = float(os.getenv("GENERATION_JOB_STALE_SECONDS", "90"))
+
+
+class GenerationJobQueue:
+    """Bounded asyncio worker pool draining the persisted generation_jobs table.
+
+    The in-memory queue only wakes workers up; the table is the source of truth,
+    so jobs enqueued by other processes or left over from a restart are picked up
+    by polling, and each job is claimed with an atomic status update.
+    """
+
+    def __init__(self, workers: int = GENERATION_JOB_WORKERS):
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if self._tasks or self.workers <= 0:
+            return
+        async with SessionLocal() as db:
+            recovered = await requeue_stale_jobs(db, GENERATION_JOB_STALE_SECONDS)
+        if recovered:
+            logger.info("Recovered %d interrupted generation job(s)", recovered)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"generation-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info("Started %d generation job worker(s)", self.workers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self, job_id: int):
+        self.queue.put_nowait(job_id)
+
+    async def _next_job_id(self) -> Optional[int]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=GENERATION_JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        async with SessionLocal() as db:
+            await requeue_stale_jobs(db, GENERATION_JOB_STALE_SECONDS)
+            pending = await list_pending_job_ids(db, limit=self.workers)
+        for job_id in pending[1:]:
+            self.queue.put_nowait(job_id)
+        return pending[0] if pending else None
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job_id = await self._next_job_id()
+                if job_id is not None:
+                    await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Generation worker %d crashed while processing a job", index)
+
+    async def _run(self, job_id: int):
+        # Each step uses its own short session, so no pooled connection is
+        # held while the generation runs
+        async with SessionLocal() as db:
+            job = await claim_generation_job(db, job_id)
+        if job is None:
+            return
+
+        # The quota slot was reserved when the job was enqueued. However long
+        # generation and repairs take, the heartbeat keeps the job from being
+        # requeued to another worker while this one is alive.
+        heartbeat = asyncio.create_task(self._heartbeat(job), name=f"generation-job-{job.id}-heartbeat")
+        try:
+            try:
+                with track_usage() as usage:
+                    quiz_data = await generate_quiz_content(
+                        job.topic, job.difficulty, job.language, job.questions_count
+                    )
+                    if "error" in quiz_data:
+                        raise RuntimeError(f"Generation returned no quiz: {quiz_data['error']}")
+                    async with SessionLocal() as db:
+                        questions = await replace_known_duplicates(
+                            db, job.user_id, job.topic, job.difficulty, job.language, quiz_data["quiz"]["questions"]
+                        )
+            finally:
+                heartbeat.cancel()
+        except CircuitOpenError:
+            # Upstream is known to be down: put the job back without
+            # spending an attempt; the poll loop picks it up later.
+            async with SessionLocal() as db:
+                job = await db.merge(job)
+                job.status = "pending"
+                job.started_at = None
+                job.attempts -= 1
+                await db.commit()
+            return
+        except Exception as exc:
+            logger.warning("Generation job %d attempt %d failed: %r", job.id, job.attempts, exc)
+            async with SessionLocal() as db:
+                job = await db.merge(job)
+                if usage.upstream_calls:
+                    # Failed attempts still cost tokens; they don't use up the daily limit
+                    db.add(build_generation(job.user_id, usage, outcome="failed"))
+                if job.attempts < GENERATION_JOB_MAX_ATTEMPTS:
+                    job.status = "pending"
+                    job.started_at = None
+                    await db.commit()
+                    self.notify(job.id)
+                else:
+                    mark_job_failed(job, "Quiz generation failed. Please try again later.")
+                    await db.commit()
+                    await refund_generations(db, job.user_id, day=job.created_at.date())
+            return
+
+        async with SessionLocal() as db:
+            # The quiz, its accounting and the job status commit together, so a
+            # crash in between cannot make a requeued job save a second quiz
+            saved, = await create_quizzes(db, [build_generated_quiz_data(
+                topic=job.topic,
+                difficulty=job.difficulty,
+                language=job.language,
+                questions=questions,
+                owner_id=job.user_id,
+                is_public=False,
+            )])
+            db.add(build_generation(job.user_id, usage))
+            if not await mark_job_succeeded(db, job, saved.id):
+                logger.warning("Generation job %d was reclaimed during attempt %d; discarding its quiz", job.id, job.attempts)
+                await db.rollback()
+                return
+            await db.commit()
+
+    async def _heartbeat(self, job):
+        while True:
+            await asyncio.sleep(GENERATION_JOB_HEARTBEAT_SECONDS)
+            try:
+                async with SessionLocal() as db:
+                    if not await heartbeat_generation_job(db, job):
+                        return
+            except Exception:
+                logger.exception("Heartbeat of generation job %d failed", job.id)
+
+generation_job_queue = GenerationJobQueue()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+
+from database.database import SessionLocal
+from database.models import Quiz, QuizStats, User, UserScore
+
+logger = logging.getLogger(__name__)
+
+# Landing-page statistics snapshot:
+# - GLOBAL_STATS_REFRESH_SECONDS: how often the snapshot is recomputed; older
+#   snapshots are still served while a single refresh runs in the background
+GLOBAL_STATS_REFRESH_SECONDS = float(os.getenv("GLOBAL_STATS_REFRESH_SECONDS", "60"))
+
+DEFAULT_TOPIC = "JavaScript Fundamentals"
+
+
+async def compute_global_stats(db) -> dict:
+    total_quizzes = (await db.execute(select(func.count(Quiz.id)))).scalar()
+    total_users = (await db.execute(select(func.count(User.id)))).scalar()
+
+    score_avg = await db.execute(
+        select(func.avg(UserScore.score * 100 / UserScore.max_score)).where(UserScore.max_score > 0)
+    )
+    avg_score = int(score_avg.scalar() or 0)
+
+    # Most attempted quiz title, from the per-quiz counters
+    attempts = func.sum(QuizStats.attempts)
+    popular_topic = await db.execute(
+        select(Quiz.title, attempts.label("attempts"))
+        .join(QuizStats, Quiz.id == QuizStats.quiz_id)
+        .group_by(Quiz.title)
+        .order_by(attempts.desc())
+        .limit(1)
+    )
+    top_topic = popular_topic.first()
+
+    return {
+        "totalQuizzes": total_quizzes,
+        "totalUsers": total_users,
+        "avgScore": avg_score,
+        "topicOfTheWeek": top_topic.title if top_topic else DEFAULT_TOPIC,
+    }
+
+
+class GlobalStatsCache:
+    """Stale-while-revalidate snapshot of the platform-wide statistics.
+
+    A background task recomputes the snapshot every refresh interval. Requests
+    always get the current snapshot; if it is older than the interval (e.g. the
+    refresher fell behind) one shared refresh is started and the stale value is
+    returned meanwhile. Only the very first request of a process waits.
+    """
+
+    def __init__(self, refresh_seconds: float = GLOBAL_STATS_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[dict] = None
+        self._taken_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run(), name="global-stats-refresher")
+
+    async def stop(self):
+        tasks = [task for task in (self._task, self._refreshing) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._refreshing = None
+
+    def age(self) -> Optional[float]:
+        if self._snapshot is None:
+            return None
+        return time.monotonic() - self._taken_at
+
+    async def get(self) -> Tuple[Optional[dict], Optional[float]]:
+        """The snapshot and its age in seconds; (None, None) if none could be computed yet."""
+        if self._snapshot is None:
+            await asyncio.shield(self._refresh_once())
+        elif self.age() > self.refresh_seconds:
+            self._refresh_once()
+        return self._snapshot, self.age()
+
+    def _refresh_once(self) -> asyncio.Task:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+        return self._refreshing
+
+    async def _refresh(self):
+        try:
+            async with SessionLocal() as db:
+                snapshot = await compute_global_stats(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Refreshing global statistics failed")
+            return
+        self._snapshot = snapshot
+        self._taken_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            await asyncio.shield(self._refresh_once())
+            await asyncio.sleep(self.refresh_seconds)
+
+
+global_stats_cache = GlobalStatsCache()
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from typing import AsyncIterator
+
+import httpx
+from dotenv import load_dotenv
+
+from app.services.usage import record_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Which backend serves completions: "mistral" (default) or "fake" for offline
+# load testing of the full generation pipeline.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "mistral").strip().lower()
+
+MISTRAL_MODEL = os.getenv("MISTRAL_MODEL", "mistral-large-latest")
+# - MISTRAL_MAX_CONNECTIONS: size of the shared keep-alive connection pool
+# - MISTRAL_TIMEOUT_SECONDS: HTTP timeout of a single upstream request (the
+#   retry/attempt deadlines live in resilience)
+MISTRAL_MAX_CONNECTIONS = int(os.getenv("MISTRAL_MAX_CONNECTIONS", "64"))
+MISTRAL_TIMEOUT_SECONDS = float(os.getenv("MISTRAL_TIMEOUT_SECONDS", "60"))
+
+# Fake provider behaviour:
+# - FAKE_LLM_LATENCY_MS / FAKE_LLM_JITTER_MS: mean latency and uniform +/- jitter
+# - FAKE_LLM_ERROR_RATE: fraction of calls raising an upstream error
+# - FAKE_LLM_MALFORMED_RATE: fraction of calls returning unparseable text
+# - FAKE_LLM_SEED: seed for the latency/error draws
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "200"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "42"))
+
+
+class LLMProviderError(Exception):
+    """Raised when a provider fails to produce a completion."""
+
+
+class LLMProvider:
+    """A chat completion backend taking a single user prompt."""
+
+    name = "base"
+    model = ""
+
+    async def complete(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion as text deltas."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class MistralProvider(LLMProvider):
+    name = "mistral"
+
+    def __init__(self):
+        from mistralai import Mistral
+
+        # One pooled async HTTP client shared by every request, so generations
+        # reuse keep-alive connections instead of pinning executor threads.
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MISTRAL_MAX_CONNECTIONS,
+                max_keepalive_connections=MISTRAL_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(MISTRAL_TIMEOUT_SECONDS, connect=10.0),
+        )
+        self.client = Mistral(
+            api_key=os.getenv("MISTRAL_API_KEY"),
+            async_client=self.http_client,
+            timeout_ms=int(MISTRAL_TIMEOUT_SECONDS * 1000),
+        )
+        self.model = MISTRAL_MODEL
+
+    async def complete(self, prompt: str) -> str:
+        response = await self.client.chat.complete_async(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        if response.usage is not None:
+            record_tokens(response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        # The pooled client's read timeout bounds the gap between chunks
+        events = await self.client.chat.stream_async(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        async for event in events:
+            # Usage is only attached to the final chunk
+            if event.data.usage is not None:
+                record_tokens(event.data.usage.prompt_tokens, event.data.usage.completion_tokens)
+            if not event.data.choices:
+                continue
+            delta = event.data.choices[0].delta.content
+            if isinstance(delta, str) and delta:
+                yield delta
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic local stand-in that answers prompts with schema-valid quizzes.
+
+    The quiz content is derived from a hash of the prompt, so identical prompts
+    always get identical questions; latency, errors and malformed replies are
+    drawn from a seeded RNG.
+    """
+
+    name = "fake"
+    model = "fake-quiz-model"
+
+    _COUNT_RE = re.compile(r"with (\d+) questions|Generate (\d+) additional")
+
+    def __init__(
+        self,
+        latency_ms: float = FAKE_LLM_LATENCY_MS,
+        jitter_ms: float = FAKE_LLM_JITTER_MS,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        malformed_rate: float = FAKE_LLM_MALFORMED_RATE,
+        seed: int = FAKE_LLM_SEED,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+
+    async def complete(self, prompt: str) -> str:
+        await asyncio.sleep(self._latency())
+        if self.rng.random() < self.error_rate:
+            raise LLMProviderError("Simulated upstream failure")
+        if self.rng.random() < self.malformed_rate:
+            text = "Sorry, I cannot produce JSON right now."
+        else:
+            text = self._render(prompt)
+        # Rough 4-characters-per-token estimate
+        record_tokens(len(prompt) // 4, len(text) // 4)
+        return text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text = await self.complete(prompt)
+        step = 32
+        for start in range(0, len(text), step):
+            await asyncio.sleep(0)
+            yield text[start:start + step]
+
+    def _latency(self) -> float:
+        jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _render(self, prompt: str) -> str:
+        match = self._COUNT_RE.search(prompt)
+        count = int(next(g for g in match.groups() if g)) if match else 5
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        questions = []
+        for i in range(count):
+            options = [f"Option {letter} ({digest}-{i})" for letter in "ABCD"]
+            questions.append({
+                "question": f"Sample question {digest}-{i + 1}: which option is correct?",
+                "options": options,
+                "answer": options[int(digest, 16) % 4],
+            })
+        return "```json\n" + json.dumps({"quiz": {"questions": questions}}) + "\n```"
+
+
+def create_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    if name == "fake":
+        logger.warning("Using the fake LLM provider — generated quizzes are placeholders")
+        return FakeProvider()
+    if name != "mistral":
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r}; expected 'mistral' or 'fake'")
+    return MistralProvider()
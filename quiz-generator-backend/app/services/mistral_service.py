@@ -2,34 +2,325 @@ import asyncio
 import json
 import logging
 import os
+import time
+from typing import AsyncIterator, List, Optional
 
 from dotenv import load_dotenv
-from mistralai import Mistral
+
+from app.services.generation_cache import GenerationCache, make_cache_key
+from app.services.llm_providers import LLMProvider, MISTRAL_TIMEOUT_SECONDS, create_provider
+from app.services.question_dedup import dedupe_questions
+from app.services.resilience import (
+    LLM_ATTEMPT_TIMEOUT_SECONDS,
+    LLM_HEDGE_PERCENTILE,
+    LLM_MAX_ATTEMPTS,
+    CircuitBreaker,
+    LatencyTracker,
+    backoff_delay,
+    hedged,
+)
+from app.services.quiz_stream_parser import QuestionStreamParser
+from app.services.quiz_validation import GENERATED_OPTIONS_COUNT, clean_generated_question
+from app.services.usage import (
+    record_generation_latency,
+    record_invalid_question,
+    record_repair_call,
+    record_upstream_call,
+)
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Upstream concurrency: max in-flight completions per worker process
+# (provider connection pool and timeouts live in llm_providers)
+MISTRAL_MAX_CONCURRENCY = int(os.getenv("MISTRAL_MAX_CONCURRENCY", "32"))
+
+# Quizzes larger than GENERATION_CHUNK_SIZE questions are split into parallel
+# sub-generations of at most that many questions each.
+DEFAULT_QUESTIONS_COUNT = 5
+MAX_QUESTIONS_COUNT = 50
+GENERATION_CHUNK_SIZE = int(os.getenv("GENERATION_CHUNK_SIZE", "10"))
+
+# Invalid or missing questions are re-requested with a small targeted prompt, at
+# most GENERATION_REPAIR_ATTEMPTS times per (sub-)generation.
+GENERATION_REPAIR_ATTEMPTS = int(os.getenv("GENERATION_REPAIR_ATTEMPTS", "2"))
+
+
+def split_question_count(total: int, chunk_size: int = GENERATION_CHUNK_SIZE) -> List[int]:
+    """Split ``total`` into the fewest near-equal chunks no larger than ``chunk_size``."""
+    parts = max(1, -(-total // max(1, chunk_size)))
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
 
 class MistralService:
-    def __init__(self):
-        self.client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
-        self.model = "mistral-large-latest"
-
-    async def generate_quiz(self, topic: str, difficulty: str, language: str) -> dict:
-        prompt = self._build_prompt(topic, difficulty, language)
-        # Use asyncio.to_thread to avoid blocking the event loop
-        # (the Mistral SDK's chat.complete is synchronous)
-        response = await asyncio.to_thread(
-            self.client.chat.complete,
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+    """Prompting, chunking, parsing and repair on top of a pluggable LLM provider.
+
+    The provider (Mistral by default, or the fake one via LLM_PROVIDER) is only
+    created on first use, so importing this module never builds an API client.
+    """
+
+    def __init__(self, provider: Optional[LLMProvider] = None):
+        self._provider = provider
+        self.semaphore = asyncio.Semaphore(MISTRAL_MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self.metrics = {
+            "questions_valid": 0,
+            "questions_invalid": 0,
+            "repair_calls": 0,
+            "questions_repaired": 0,
+            "repair_budget_exhausted": 0,
+            "upstream_retries": 0,
+            "upstream_hedges": 0,
+            "known_duplicates": 0,
+        }
+
+    async def generate_quiz(
+        self,
+        topic: str,
+        difficulty: str,
+        language: str,
+        questions_count: int = DEFAULT_QUESTIONS_COUNT,
+    ) -> dict:
+        chunks = split_question_count(questions_count)
+        if len(chunks) == 1:
+            return await self._generate_part(topic, difficulty, language, questions_count)
+
+        results = await asyncio.gather(
+            *(
+                self._generate_part(topic, difficulty, language, count, part=i + 1, parts=len(chunks))
+                for i, count in enumerate(chunks)
+            ),
+            return_exceptions=True,
         )
-        return self._parse_response(response.choices[0].message.content)
+        questions = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning("Quiz chunk generation failed: %r", result)
+                continue
+            questions.extend(result.get("quiz", {}).get("questions") or [])
+
+        if not questions:
+            failures = [r for r in results if isinstance(r, BaseException)]
+            if failures:
+                raise failures[0]
+            return {"error": "Failed to parse JSON response", "content": ""}
+
+        # Parallel chunks cannot see each other, so drop reworded repeats and
+        # re-request whatever that leaves missing
+        questions = dedupe_questions(questions)[:questions_count]
+        questions = await self.fill_missing(topic, difficulty, language, questions, questions_count)
+        return {"quiz": {"questions": questions}}
+
+    async def _generate_part(
+        self,
+        topic: str,
+        difficulty: str,
+        language: str,
+        questions_count: int,
+        part: int = None,
+        parts: int = None,
+    ) -> dict:
+        prompt = self._build_prompt(topic, difficulty, language, questions_count, part, parts)
+        # Bounded by the per-attempt deadlines and retry budget in _complete,
+        # which only start once a concurrency slot is held
+        content = await self._complete(prompt)
+        quiz_data = self._parse_response(content)
+        questions = self.valid_questions(quiz_data)
+        questions = await self.fill_missing(topic, difficulty, language, questions, questions_count)
+        if not questions:
+            return quiz_data if "error" in quiz_data else {"error": "No valid questions generated", "content": content}
+        return {"quiz": {"questions": questions}}
+
+    def valid_questions(self, quiz_data: dict) -> List[dict]:
+        """Keep the questions that pass validation, counting the rejects."""
+        quiz = quiz_data.get("quiz") if isinstance(quiz_data, dict) else None
+        raw = quiz.get("questions") if isinstance(quiz, dict) else None
+        if not isinstance(raw, list):
+            return []
+        questions = []
+        for item in raw:
+            question = clean_generated_question(item)
+            if question is None:
+                self.metrics["questions_invalid"] += 1
+                record_invalid_question()
+                continue
+            self.metrics["questions_valid"] += 1
+            questions.append(question)
+        return questions
+
+    async def fill_missing(
+        self,
+        topic: str,
+        difficulty: str,
+        language: str,
+        questions: List[dict],
+        target: int,
+        avoid: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """Re-request only the questions still missing, within the repair budget.
+
+        ``avoid`` lists extra question texts the replacements must not repeat.
+        """
+        questions = list(questions)
+        attempts = 0
+        while len(questions) < target:
+            if attempts >= GENERATION_REPAIR_ATTEMPTS:
+                self.metrics["repair_budget_exhausted"] += 1
+                logger.warning(
+                    "Repair budget exhausted with %d/%d valid questions for %r",
+                    len(questions), target, topic,
+                )
+                break
+            attempts += 1
+            missing = target - len(questions)
+            self.metrics["repair_calls"] += 1
+            record_repair_call()
+            prompt = self._build_repair_prompt(
+                topic, difficulty, language, missing, [q["question"] for q in questions] + (avoid or [])
+            )
+            try:
+                content = await self._complete(prompt)
+            except Exception as exc:
+                # Repairs are best effort: keep the valid questions we already have
+                logger.warning("Repair request failed for %r: %r", topic, exc)
+                continue
+            candidates = self.valid_questions(self._parse_response(content))
+            existing = {id(q) for q in questions}
+            added = [q for q in dedupe_questions(questions + candidates) if id(q) not in existing][:missing]
+            self.metrics["questions_repaired"] += len(added)
+            questions.extend(added)
+        return questions
+
+    @property
+    def provider(self) -> LLMProvider:
+        if self._provider is None:
+            self._provider = create_provider()
+        return self._provider
+
+    @property
+    def model(self) -> str:
+        return self.provider.model
+
+    def set_provider(self, provider: LLMProvider):
+        self._provider = provider
+
+    async def _complete(self, prompt: str) -> str:
+        """Call the provider with per-attempt deadlines, jittered retries, optional
+        hedging and a circuit breaker that fails fast with CircuitOpenError."""
+        attempt = 0
+        while True:
+            attempt += 1
+            # The attempt deadline and hedge timer only start once a slot is
+            # held, so local queueing is never mistaken for a slow upstream
+            async with self.semaphore:
+                self.breaker.before_call()
+                try:
+                    content = await asyncio.wait_for(
+                        hedged(
+                            lambda: self._timed_complete(prompt),
+                            self._hedge_delay(),
+                            self._count_hedge,
+                            hedge_call=lambda: self._hedge_complete(prompt),
+                        ),
+                        timeout=LLM_ATTEMPT_TIMEOUT_SECONDS,
+                    )
+                except asyncio.CancelledError:
+                    self.breaker.abandon()
+                    raise
+                except Exception as exc:
+                    self.breaker.record_failure()
+                    if attempt >= LLM_MAX_ATTEMPTS:
+                        raise
+                    error = exc
+                else:
+                    self.breaker.record_success()
+                    return content
+            # Back off without holding the slot
+            delay = backoff_delay(attempt)
+            self.metrics["upstream_retries"] += 1
+            logger.warning(
+                "Upstream attempt %d/%d failed (%r); retrying in %.2fs",
+                attempt, LLM_MAX_ATTEMPTS, error, delay,
+            )
+            await asyncio.sleep(delay)
 
-    def _build_prompt(self, topic: str, difficulty: str, language: str) -> str:
+    async def _timed_complete(self, prompt: str) -> str:
+        """One provider call; the caller holds a semaphore slot."""
+        record_upstream_call(self.model)
+        started = time.monotonic()
+        content = await self.provider.complete(prompt)
+        self.latencies.add(time.monotonic() - started)
+        return content
+
+    def _hedge_complete(self, prompt: str):
+        # Hedge only into a free slot: a queued hedge just adds load
+        if self.semaphore.locked():
+            return None
+
+        async def call():
+            async with self.semaphore:
+                return await self._timed_complete(prompt)
+        return call()
+
+    def _count_hedge(self):
+        self.metrics["upstream_hedges"] += 1
+
+    def _hedge_delay(self) -> Optional[float]:
+        if LLM_HEDGE_PERCENTILE <= 0:
+            return None
+        return self.latencies.percentile(LLM_HEDGE_PERCENTILE)
+
+    async def stream_quiz(
+        self,
+        topic: str,
+        difficulty: str,
+        language: str,
+        questions_count: int = DEFAULT_QUESTIONS_COUNT,
+    ) -> AsyncIterator[dict]:
+        """Yield each question as soon as it is complete in the model's token stream."""
+        prompt = self._build_prompt(topic, difficulty, language, questions_count)
+        parser = QuestionStreamParser()
+        self.breaker.before_call()
+        try:
+            async with self.semaphore:
+                record_upstream_call(self.model)
+                async for delta in self.provider.stream(prompt):
+                    for question in parser.feed(delta):
+                        yield question
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.abandon()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+
+    async def aclose(self):
+        if self._provider is not None:
+            await self._provider.aclose()
+
+    def _build_prompt(
+        self,
+        topic: str,
+        difficulty: str,
+        language: str,
+        questions_count: int = DEFAULT_QUESTIONS_COUNT,
+        part: int = None,
+        parts: int = None,
+    ) -> str:
+        focus = ""
+        if part and parts:
+            focus = (
+                f"This is part {part} of {parts} of a larger quiz generated in parallel. "
+                f"Split {topic} into {parts} distinct subareas and only ask about subarea #{part}, "
+                "so these questions do not overlap with the other parts.\n\n"
+            )
         return (
-            f"Generate a {difficulty} quiz on {topic} in {language} with 5 questions and 4 options each.\n\n"
+            f"Generate a {difficulty} quiz on {topic} in {language} with {questions_count} questions and 4 options each.\n\n"
+            f"{focus}"
             "Requirements:\n"
             f"- Questions should be accurate, clear, and appropriate for {difficulty} level\n"
             "- Each question must have exactly 4 options with only one correct answer\n"
@@ -46,13 +337,33 @@ class MistralService:
             '"options": ["Berlin", "Madrid", "Paris", "Rome"],\n'
             '"answer": "Paris"\n'
             "},\n"
-            "... 4 more questions ...\n"
+            f"... {questions_count - 1} more questions ...\n"
             "]\n"
             "}\n"
             "}\n"
             "```"
         )
 
+    def _build_repair_prompt(
+        self,
+        topic: str,
+        difficulty: str,
+        language: str,
+        questions_count: int,
+        existing: List[str],
+    ) -> str:
+        avoid = "".join(f"- {text}\n" for text in existing)
+        return (
+            f"Generate {questions_count} additional {difficulty} multiple-choice questions on {topic} in {language}.\n"
+            f"Each question must have exactly {GENERATED_OPTIONS_COUNT} non-empty options, "
+            'and "answer" must be exactly one of the options.\n'
+            + (f"Do not repeat any of these questions:\n{avoid}" if avoid else "")
+            + "\nReturn only JSON wrapped in:\n"
+            "```json\n"
+            '{"quiz": {"questions": [{"question": "...", "options": ["...", "...", "...", "..."], "answer": "..."}]}}\n'
+            "```"
+        )
+
     def _parse_response(self, quiz_content: str) -> dict:
         try:
             json_str = quiz_content.split("```json")[1].split("```")[0].strip()
@@ -62,8 +373,60 @@ class MistralService:
             return {"error": "Failed to parse JSON response", "content": quiz_content}
 
 
+def _is_usable_quiz(quiz_data: dict) -> bool:
+    return "error" not in quiz_data and bool(quiz_data.get("quiz", {}).get("questions"))
+
+
 mistral_service = MistralService()
+generation_cache = GenerationCache(is_cacheable=_is_usable_quiz)
+
+
+async def generate_quiz_content(
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions_count: int = DEFAULT_QUESTIONS_COUNT,
+) -> dict:
+    # Identical (normalized) requests are served from the cache or share a
+    # single in-flight upstream call; the caller still records a Generation.
+    started = time.monotonic()
+    try:
+        return await generation_cache.get_or_generate(
+            make_cache_key(topic, difficulty, language, questions_count),
+            lambda: mistral_service.generate_quiz(topic, difficulty, language, questions_count),
+        )
+    finally:
+        record_generation_latency(time.monotonic() - started)
+
+
+async def stream_quiz_content(
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions_count: int = DEFAULT_QUESTIONS_COUNT,
+) -> AsyncIterator[dict]:
+    key = make_cache_key(topic, difficulty, language, questions_count)
+    cached = generation_cache.peek(key)
+    if cached is not None:
+        for question in cached["quiz"]["questions"]:
+            yield question
+        return
 
+    started = time.monotonic()
+    questions = []
+    async for raw in mistral_service.stream_quiz(topic, difficulty, language, questions_count):
+        question = clean_generated_question(raw)
+        if question is None:
+            mistral_service.metrics["questions_invalid"] += 1
+            record_invalid_question()
+            continue
+        mistral_service.metrics["questions_valid"] += 1
+        questions.append(question)
+        yield question
 
-async def generate_quiz_content(topic: str, difficulty: str, language: str) -> dict:
-    return await mistral_service.generate_quiz(topic, difficulty, language)
+    # Top up whatever was dropped during streaming with a targeted follow-up
+    repaired = await mistral_service.fill_missing(topic, difficulty, language, questions, questions_count)
+    for question in repaired[len(questions):]:
+        yield question
+    record_generation_latency(time.monotonic() - started)
+    generation_cache.put(key, {"quiz": {"questions": repaired}})
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+from passlib.exc import MissingBackendError
+
+logger = logging.getLogger(__name__)
+
+# Password hashing settings:
+# - PASSWORD_HASH_WORKERS: processes dedicated to bcrypt (0 uses a thread pool instead)
+# - PASSWORD_HASH_MAX_PENDING: hash/verify calls allowed in flight or queued before
+#   new ones are rejected with 429
+# - PASSWORD_BCRYPT_ROUNDS: bcrypt cost; existing hashes with another cost are
+#   upgraded on the next successful login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt_sha256", "bcrypt"],
+    deprecated=["bcrypt"],
+    bcrypt_sha256__rounds=PASSWORD_BCRYPT_ROUNDS,
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised instead of queueing when too many hash operations are pending."""
+
+
+class PasswordTooLong(ValueError):
+    pass
+
+
+class HashingBackendUnavailable(RuntimeError):
+    pass
+
+
+# The two functions below run inside the worker processes, so they only rely
+# on module-level state.
+
+def _hash(password: str) -> str:
+    try:
+        return pwd_context.hash(password)
+    except MissingBackendError as exc:
+        raise HashingBackendUnavailable(str(exc)) from None
+    except ValueError as exc:
+        raise PasswordTooLong(str(exc)) from None
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return pwd_context.verify_and_update(password, hashed_password)
+    except (ValueError, TypeError, MissingBackendError):
+        return False, None
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded worker pool."""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.metrics = {"hashes": 0, "verifications": 0, "rehashes": 0, "rejected": 0}
+        self._latencies: deque = deque(maxlen=500)
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                # spawn: forking a process that runs an event loop and DB pools is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def hash(self, password: str) -> str:
+        self.metrics["hashes"] += 1
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash should be upgraded."""
+        if not hashed_password:
+            return False, None
+        self.metrics["verifications"] += 1
+        valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        if new_hash:
+            self.metrics["rehashes"] += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        ordered = sorted(self._latencies)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 1) if ordered else None
+
+        return {
+            **self.metrics,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99)},
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.metrics["rejected"] += 1
+            raise PasswordHasherBusy()
+        self.pending += 1
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self._latencies.append(time.monotonic() - started)
+
+
+password_hasher = PasswordHasher()
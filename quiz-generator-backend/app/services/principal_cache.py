@@ -0,0 +1,98 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from database.models import User
+
+# Authenticated-user cache used by get_current_user:
+# - AUTH_USER_CACHE_SIZE: max cached principals per worker process (0 disables)
+# - AUTH_USER_CACHE_TTL_SECONDS: how long a snapshot is trusted; also bounds how
+#   long other worker processes may serve a snapshot after a profile change
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+
+_USER_COLUMNS = [column.key for column in User.__table__.columns]
+
+
+class PrincipalCache:
+    """LRU + TTL cache of user column snapshots keyed by the token subject.
+
+    The token itself is still verified on every request; only the user lookup
+    is skipped. Snapshots are re-attached to the request's session with
+    ``merge(load=False)``, so handlers can modify or delete the user as before
+    without an extra SELECT.
+    """
+
+    def __init__(self, maxsize: int = AUTH_USER_CACHE_SIZE, ttl: float = AUTH_USER_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    async def get(self, db, subject: str) -> Optional[User]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(subject)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(subject)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        user = User(**entry[1])
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    def put(self, subject: str, user: User):
+        if not self.enabled:
+            return
+        snapshot = {key: getattr(user, key) for key in _USER_COLUMNS}
+        self._remove(subject)
+        self._entries[subject] = (time.monotonic() + self.ttl, snapshot)
+        self._keys_by_user.setdefault(user.id, set()).add(subject)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id: int):
+        """Forget every snapshot of a user; call after any change to the users row."""
+        for subject in self._keys_by_user.pop(user_id, set()):
+            self._entries.pop(subject, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, subject: str):
+        entry = self._entries.pop(subject, None)
+        if entry is None:
+            return
+        user_id = entry[1]["id"]
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(subject)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+principal_cache = PrincipalCache()
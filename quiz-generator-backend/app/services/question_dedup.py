@@ -0,0 +1,110 @@
+import hashlib
+import random
+import re
+from array import array
+from typing import List, NamedTuple, Tuple
+
+# Two questions with the same answer whose word sets overlap at least this much
+# are treated as duplicates. Requiring the same answer keeps questions that only
+# differ in their key term ("Battle of Hastings" vs "Battle of Waterloo") apart.
+DUPLICATE_SIMILARITY_THRESHOLD = 0.7
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def question_tokens(text: str) -> frozenset:
+    return frozenset(_WORD_RE.findall((text or "").casefold()))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _normalize_answer(answer) -> str:
+    return " ".join(str(answer or "").split()).casefold()
+
+
+def dedupe_questions(questions: List[dict], threshold: float = DUPLICATE_SIMILARITY_THRESHOLD) -> List[dict]:
+    """Drop questions that nearly repeat an earlier one, keeping order."""
+    kept: List[dict] = []
+    seen: List[tuple] = []
+    for question in questions:
+        answer = _normalize_answer(question.get("answer"))
+        tokens = question_tokens(question.get("question", ""))
+        if any(answer == other_answer and jaccard(tokens, other_tokens) >= threshold
+               for other_answer, other_tokens in seen):
+            continue
+        kept.append(question)
+        seen.append((answer, tokens))
+    return kept
+
+
+# MinHash signatures estimate the Jaccard similarity of question word sets, and
+# LSH banding turns them into a handful of bucket keys so near-duplicates can be
+# found with an index lookup instead of comparing against every question.
+# With 10 bands of 3 rows, pairs at the duplicate threshold (0.7) share at
+# least one bucket ~98.5% of the time.
+MINHASH_PERMUTATIONS = 30
+LSH_BANDS = 10
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def minhash_signature(tokens: frozenset) -> Tuple[int, ...]:
+    hashes = [_hash64(token) for token in tokens] or [0]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def lsh_buckets(signature: Tuple[int, ...], answer) -> List[int]:
+    """Signed 64-bit bucket keys, one per band; the answer is part of every key
+    so only questions with the same answer become candidates."""
+    answer = _normalize_answer(answer)
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(
+            f"{answer}|{band}|{','.join(map(str, rows))}".encode("utf-8"), digest_size=8
+        ).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+
+def pack_signature(signature: Tuple[int, ...]) -> bytes:
+    return array("I", signature).tobytes()
+
+
+def unpack_signature(data: bytes) -> Tuple[int, ...]:
+    values = array("I")
+    values.frombytes(data)
+    return tuple(values)
+
+
+def signature_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class QuestionFingerprint(NamedTuple):
+    signature: Tuple[int, ...]
+    buckets: List[int]
+
+
+def question_fingerprint(question: dict) -> QuestionFingerprint:
+    signature = minhash_signature(question_tokens(question.get("question", "")))
+    return QuestionFingerprint(signature, lsh_buckets(signature, question.get("answer")))
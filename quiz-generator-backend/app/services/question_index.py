@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+from app.services.mistral_service import mistral_service
+from app.services.question_dedup import (
+    DUPLICATE_SIMILARITY_THRESHOLD,
+    question_fingerprint,
+    signature_similarity,
+    unpack_signature,
+)
+from crud.question_fingerprint_crud import find_fingerprint_candidates, list_owner_fingerprints
+from database.models import Quiz
+
+
+async def find_known_duplicates(
+    db,
+    questions: List[dict],
+    owner_id: Optional[int] = None,
+    threshold: float = DUPLICATE_SIMILARITY_THRESHOLD,
+) -> List[bool]:
+    """Flag each question that nearly repeats an indexed one (of ``owner_id``'s quizzes if given).
+
+    One indexed lookup on the LSH buckets of all questions, then candidates are
+    confirmed with their MinHash signatures.
+    """
+    fingerprints = [question_fingerprint(question) for question in questions]
+    rows = await find_fingerprint_candidates(
+        db,
+        (bucket for fingerprint in fingerprints for bucket in fingerprint.buckets),
+        owner_id=owner_id,
+    )
+    candidates: Dict[int, list] = {}
+    for row in rows:
+        candidates.setdefault(row.bucket, []).append(row.signature)
+
+    flags = []
+    for fingerprint in fingerprints:
+        flags.append(any(
+            signature_similarity(fingerprint.signature, unpack_signature(signature)) >= threshold
+            for bucket in fingerprint.buckets
+            for signature in candidates.get(bucket, ())
+        ))
+    return flags
+
+
+async def replace_known_duplicates(
+    db,
+    owner_id: int,
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions: List[dict],
+) -> List[dict]:
+    """Swap out questions the user already has in one of their quizzes.
+
+    Replacements come from the repair path, so they share its budget; if it
+    runs out the quiz is returned shorter rather than with repeats.
+    """
+    flags = await find_known_duplicates(db, questions, owner_id=owner_id)
+    repeats = [question for question, seen in zip(questions, flags) if seen]
+    if not repeats:
+        return questions
+    mistral_service.metrics["known_duplicates"] += len(repeats)
+    fresh = [question for question, seen in zip(questions, flags) if not seen]
+    return await mistral_service.fill_missing(
+        topic,
+        difficulty,
+        language,
+        fresh,
+        len(questions),
+        avoid=[question["question"] for question in repeats],
+    )
+
+
+async def duplicate_clusters(
+    db,
+    owner_id: int,
+    threshold: float = DUPLICATE_SIMILARITY_THRESHOLD,
+) -> List[List[dict]]:
+    """Groups of near-identical questions across the owner's quizzes, largest first."""
+    rows = await list_owner_fingerprints(db, owner_id)
+    by_bucket: Dict[int, list] = {}
+    members: Dict[int, tuple] = {}
+    for row in rows:
+        by_bucket.setdefault(row.bucket, []).append(row.id)
+        members[row.id] = (row.quiz_id, row.position, unpack_signature(row.signature))
+
+    # Union-find over candidate pairs confirmed by signature similarity
+    parent = {fingerprint_id: fingerprint_id for fingerprint_id in members}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for ids in by_bucket.values():
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                if find(a) != find(b) and signature_similarity(members[a][2], members[b][2]) >= threshold:
+                    parent[find(a)] = find(b)
+
+    groups: Dict[int, list] = {}
+    for fingerprint_id in members:
+        groups.setdefault(find(fingerprint_id), []).append(fingerprint_id)
+    clusters = [ids for ids in groups.values() if len(ids) > 1]
+    if not clusters:
+        return []
+
+    quiz_ids = {members[fingerprint_id][0] for ids in clusters for fingerprint_id in ids}
+    result = await db.execute(select(Quiz.id, Quiz.title, Quiz.questions).where(Quiz.id.in_(quiz_ids)))
+    quizzes = {row.id: row for row in result.all()}
+
+    report = []
+    for ids in clusters:
+        cluster = []
+        for fingerprint_id in sorted(ids, key=lambda i: members[i][:2]):
+            quiz_id, position, _ = members[fingerprint_id]
+            quiz = quizzes.get(quiz_id)
+            questions = (quiz.questions or []) if quiz else []
+            question = questions[position] if position < len(questions) else {}
+            cluster.append({
+                "quiz_id": quiz_id,
+                "quiz_title": quiz.title if quiz else None,
+                "position": position,
+                "question": question.get("question"),
+                "answer": question.get("answer"),
+            })
+        report.append(cluster)
+    report.sort(key=len, reverse=True)
+    return report
@@ -1,15 +1,99 @@
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select, func
+
+from app.services.usage import GenerationUsage
+from crud.generation_quota_crud import create_quota_row, decrement_quota, get_quota_used, increment_quota
 from crud.quiz_crud import create_quiz
+from database.models import Generation
 
-async def save_generated_quiz(
+# Daily generation limit per user
+DAILY_GENERATION_LIMIT = 5
+
+
+async def count_today_generations(db, user_id: int) -> int:
+    today = datetime.now(timezone.utc).date()
+    today_start = datetime.combine(today, datetime.min.time())
+    q = select(func.count(Generation.id)).where(
+        Generation.user_id == user_id,
+        Generation.outcome == "success",
+        Generation.created_at >= today_start,
+    )
+    result = await db.execute(q)
+    return result.scalar() or 0
+
+
+def build_generation(user_id: int, usage: Optional[GenerationUsage] = None, outcome: str = "success") -> Generation:
+    """A Generation row carrying the request's token, latency and cost accounting."""
+    generation = Generation(user_id=user_id, outcome=outcome)
+    if usage is not None:
+        usage.finish()
+        generation.source = usage.source
+        generation.model = usage.model
+        generation.prompt_tokens = usage.prompt_tokens
+        generation.completion_tokens = usage.completion_tokens
+        generation.estimated_cost = usage.estimated_cost
+        generation.upstream_calls = usage.upstream_calls
+        generation.repair_calls = usage.repair_calls
+        generation.invalid_questions = usage.invalid_questions
+        generation.upstream_latency_ms = usage.upstream_latency_ms
+        generation.total_latency_ms = usage.total_latency_ms
+    return generation
+
+
+def quota_day() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+async def reserve_generations(db, user_id: int, count: int = 1, day: Optional[date] = None) -> int:
+    """Atomically take up to ``count`` of today's generation slots; returns how many were granted.
+
+    Each slot is a conditional increment of the user's counter row, so parallel
+    requests cannot overspend the limit. Commits, so the reservation holds while
+    the (slow) generation runs without keeping a transaction open.
+    """
+    day = day or quota_day()
+    granted = 0
+    seeded = False
+    while granted < count:
+        if await increment_quota(db, user_id, day, DAILY_GENERATION_LIMIT):
+            granted += 1
+            continue
+        if seeded or await get_quota_used(db, user_id, day) is not None:
+            break
+        # First reservation of the day: seed the counter from generations
+        # recorded before it existed
+        await create_quota_row(db, user_id, day, used=await count_today_generations(db, user_id))
+        seeded = True
+    await db.commit()
+    return granted
+
+
+async def refund_generations(db, user_id: int, count: int = 1, day: Optional[date] = None):
+    """Give back slots reserved for generations that produced no quiz."""
+    if count <= 0:
+        return
+    await decrement_quota(db, user_id, day or quota_day(), count)
+    await db.commit()
+
+
+async def remaining_generations(db, user_id: int) -> int:
+    used = await get_quota_used(db, user_id, quota_day())
+    if used is None:
+        used = await count_today_generations(db, user_id)
+    return max(0, DAILY_GENERATION_LIMIT - used)
+
+
+def build_generated_quiz_data(
     topic: str,
     difficulty: str,
     language: str,
     questions: list,
-    db,
     owner_id: int,
     is_public: bool = False,
-):
-    quiz_data = {
+) -> dict:
+    return {
         "title": topic,
         "description": f"Auto-generated {difficulty} quiz about {topic}",
         "language": language,
@@ -18,4 +102,16 @@ async def save_generated_quiz(
         "owner_id": owner_id,
         "is_public": is_public,
     }
-    return await create_quiz(db, quiz_data)
\ No newline at end of file
+
+
+async def save_generated_quiz(
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions: list,
+    db,
+    owner_id: int,
+    is_public: bool = False,
+):
+    quiz_data = build_generated_quiz_data(topic, difficulty, language, questions, owner_id, is_public)
+    return await create_quiz(db, quiz_data)
@@ -0,0 +1,77 @@
+import json
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionStreamParser:
+    """Incrementally extract question objects from a streamed model response.
+
+    Text is fed chunk by chunk; once the ``"questions"`` array has started, every
+    top-level ``{...}`` object inside it is returned as soon as its closing brace
+    arrives. Scanning resumes where the previous chunk stopped, so each character
+    is inspected once.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.questions: List[dict] = []
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = None
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.buffer += chunk
+        parsed = []
+
+        if not self._in_array:
+            marker = self.buffer.find('"questions"')
+            if marker == -1:
+                return parsed
+            bracket = self.buffer.find("[", marker)
+            if bracket == -1:
+                return parsed
+            self._in_array = True
+            self._pos = bracket + 1
+
+        while self._pos < len(self.buffer) and not self._done:
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = self._pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    question = self._load(self.buffer[self._start:self._pos + 1])
+                    if question is not None:
+                        self.questions.append(question)
+                        parsed.append(question)
+                    self._start = None
+            elif char == "]" and self._depth == 0:
+                self._done = True
+            self._pos += 1
+
+        return parsed
+
+    def _load(self, raw: str):
+        try:
+            question = json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping unparseable streamed question: %s", e)
+            return None
+        return question if isinstance(question, dict) else None
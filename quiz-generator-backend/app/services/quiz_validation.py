@@ -0,0 +1,62 @@
+from typing import List, Optional
+
+# Generated questions must match the prompt contract exactly
+GENERATED_OPTIONS_COUNT = 4
+
+
+def question_errors(question: dict, position: int, options_count: Optional[int] = None) -> List[str]:
+    """Return the editor's validation messages for one question (1-based position)."""
+    errors = []
+    text = question.get("question")
+    options = question.get("options")
+    if not isinstance(options, list):
+        options = []
+    answer = question.get("answer")
+
+    if not isinstance(text, str) or len(text.strip()) < 5:
+        errors.append(f"Question {position}: Question text must be at least 5 characters long")
+
+    if options_count is not None and len(options) != options_count:
+        errors.append(f"Question {position}: Must have exactly {options_count} options")
+    elif len(options) < 2:
+        errors.append(f"Question {position}: Must have at least 2 options")
+
+    if not answer or answer not in options:
+        errors.append(f"Question {position}: Must select a valid answer from the options")
+
+    for j, option in enumerate(options):
+        if not isinstance(option, str) or len(option.strip()) == 0:
+            errors.append(f"Question {position}, Option {j+1}: Cannot be empty")
+
+    return errors
+
+
+def clean_generated_question(raw) -> Optional[dict]:
+    """Normalize a model-produced question, or return None if it cannot be used.
+
+    Whitespace is trimmed and an answer that only differs from an option by case
+    or spacing is snapped to that option before validating.
+    """
+    if not isinstance(raw, dict):
+        return None
+
+    text = raw.get("question")
+    options = raw.get("options")
+    answer = raw.get("answer")
+    question = {
+        "question": text.strip() if isinstance(text, str) else text,
+        "options": [o.strip() if isinstance(o, str) else o for o in options] if isinstance(options, list) else options,
+        "answer": answer.strip() if isinstance(answer, str) else answer,
+    }
+
+    if isinstance(question["options"], list) and isinstance(question["answer"], str):
+        if question["answer"] not in question["options"]:
+            wanted = " ".join(question["answer"].split()).casefold()
+            for option in question["options"]:
+                if isinstance(option, str) and " ".join(option.split()).casefold() == wanted:
+                    question["answer"] = option
+                    break
+
+    if question_errors(question, 1, options_count=GENERATED_OPTIONS_COUNT):
+        return None
+    return question
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from crud.user_crud import delete_stale_reset_tokens
+from database.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Password reset token cleanup:
+# - RESET_TOKEN_SWEEP_INTERVAL_SECONDS: how often expired tokens are purged (0 disables)
+# - RESET_TOKEN_SWEEP_BATCH_SIZE: rows deleted per statement, so a large backlog
+#   never holds a long lock on password_reset_tokens
+# - RESET_TOKEN_RETENTION_HOURS: grace period before expired tokens are deleted
+RESET_TOKEN_SWEEP_INTERVAL_SECONDS = float(os.getenv("RESET_TOKEN_SWEEP_INTERVAL_SECONDS", "3600"))
+RESET_TOKEN_SWEEP_BATCH_SIZE = int(os.getenv("RESET_TOKEN_SWEEP_BATCH_SIZE", "1000"))
+RESET_TOKEN_RETENTION_HOURS = float(os.getenv("RESET_TOKEN_RETENTION_HOURS", "24"))
+
+
+class ResetTokenSweeper:
+    """Periodically deletes expired password reset tokens in bounded batches."""
+
+    def __init__(
+        self,
+        interval: float = RESET_TOKEN_SWEEP_INTERVAL_SECONDS,
+        batch_size: int = RESET_TOKEN_SWEEP_BATCH_SIZE,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and self.batch_size > 0
+
+    async def start(self):
+        if self._task is not None or not self.enabled:
+            return
+        self._task = asyncio.create_task(self._run(), name="reset-token-sweeper")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def sweep(self) -> int:
+        before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=RESET_TOKEN_RETENTION_HOURS)
+        total = 0
+        while True:
+            async with SessionLocal() as db:
+                deleted = await delete_stale_reset_tokens(db, before, self.batch_size)
+            total += deleted
+            if deleted < self.batch_size:
+                return total
+            # Let requests interleave between batches
+            await asyncio.sleep(0)
+
+    async def _run(self):
+        while True:
+            try:
+                deleted = await self.sweep()
+                if deleted:
+                    logger.info("Deleted %d stale password reset token(s)", deleted)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Password reset token sweep failed")
+            await asyncio.sleep(self.interval)
+
+
+reset_token_sweeper = ResetTokenSweeper()
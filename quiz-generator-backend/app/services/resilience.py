@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upstream resilience settings:
+# - LLM_ATTEMPT_TIMEOUT_SECONDS: deadline for a single upstream attempt
+# - LLM_MAX_ATTEMPTS: attempts per completion (1 disables retries)
+# - LLM_RETRY_BASE_DELAY_SECONDS / LLM_RETRY_MAX_DELAY_SECONDS: full-jitter backoff bounds
+# - LLM_HEDGE_PERCENTILE: send a second request once an attempt is slower than
+#   this latency percentile (0 disables hedging)
+# - LLM_BREAKER_*: open the circuit when the failure rate over the window crosses
+#   the threshold, then fail fast for LLM_BREAKER_OPEN_SECONDS
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "30"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "8"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_WINDOW_SECONDS = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "60"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Upstream circuit open; retry after {retry_after:.0f}s")
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding time window.
+
+    closed -> open when at least ``min_calls`` outcomes in the window fail at
+    ``failure_rate`` or more; open -> half-open after ``open_seconds``, where a
+    single probe call decides between closing again and re-opening.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = LLM_BREAKER_WINDOW_SECONDS,
+        min_calls: int = LLM_BREAKER_MIN_CALLS,
+        failure_rate: float = LLM_BREAKER_FAILURE_RATE,
+        open_seconds: float = LLM_BREAKER_OPEN_SECONDS,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self._outcomes: deque = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        now = time.monotonic()
+        if self.state == "open":
+            remaining = self._opened_at + self.open_seconds - now
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.open_seconds)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        if self.state == "half_open":
+            logger.info("Upstream probe succeeded — closing circuit")
+            self.state = "closed"
+            self._outcomes.clear()
+            self._probe_in_flight = False
+            return
+        self._record(True)
+
+    def record_failure(self):
+        if self.state == "half_open":
+            self._open()
+            return
+        self._record(False)
+        total = len(self._outcomes)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if self.state == "closed" and total >= self.min_calls and failures / total >= self.failure_rate:
+            self._open()
+
+    def abandon(self):
+        """Forget a call that was cancelled before it produced an outcome."""
+        if self.state == "half_open":
+            self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        total = len(self._outcomes)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_failures": failures,
+            "retry_after": round(self.retry_after(), 1),
+        }
+
+    def _record(self, ok: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        self._trim(now)
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def _open(self):
+        logger.warning("Upstream failure rate too high — opening circuit for %.0fs", self.open_seconds)
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Keeps recent successful latencies to derive the hedging delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self._samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given 1-based attempt."""
+    cap = min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * (2 ** (attempt - 1)))
+    return random.uniform(0, cap)
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    hedge_after: Optional[float],
+    on_hedge: Optional[Callable[[], None]] = None,
+    hedge_call: Optional[Callable[[], Optional[Awaitable[T]]]] = None,
+) -> T:
+    """Run ``call``; if it is still pending after ``hedge_after`` seconds start a
+    second identical call and return whichever succeeds first.
+
+    ``hedge_call`` (default ``call``) starts the second call; it may return
+    None to skip hedging.
+    """
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            second = (hedge_call or call)() if not done else None
+            if second is not None:
+                logger.info("Upstream call slower than %.2fs — sending hedged request", hedge_after)
+                tasks.append(asyncio.ensure_future(second))
+                if on_hedge is not None:
+                    on_hedge()
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Also reached when the caller's deadline cancels us
+        for task in tasks:
+            if not task.done():
+                task.cancel()
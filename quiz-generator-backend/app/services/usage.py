@@ -0,0 +1,146 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+# Price per million tokens used to estimate generation cost (USD)
+LLM_PROMPT_COST_PER_MTOK = float(os.getenv("LLM_PROMPT_COST_PER_MTOK", "2.0"))
+LLM_COMPLETION_COST_PER_MTOK = float(os.getenv("LLM_COMPLETION_COST_PER_MTOK", "6.0"))
+
+
+class GenerationUsage:
+    """Upstream work attributed to one generation request.
+
+    Set as the current usage with ``track_usage()``; tasks spawned inside the
+    scope (chunks, hedges, single-flight leaders) inherit the same object, so
+    everything they do is accounted to the request that started them.
+    """
+
+    def __init__(self):
+        self.model: Optional[str] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.upstream_calls = 0
+        self.upstream_latency_ms = 0
+        self.repair_calls = 0
+        self.invalid_questions = 0
+        self.pool_hit = False
+        self._started = time.monotonic()
+        self.total_latency_ms = 0
+
+    @property
+    def source(self) -> str:
+        # Cache hits and coalesced requests never reach the provider themselves
+        if self.pool_hit:
+            return "pool"
+        return "upstream" if self.upstream_calls else "cache"
+
+    @property
+    def estimated_cost(self) -> float:
+        return (
+            self.prompt_tokens * LLM_PROMPT_COST_PER_MTOK
+            + self.completion_tokens * LLM_COMPLETION_COST_PER_MTOK
+        ) / 1_000_000
+
+    def finish(self):
+        self.total_latency_ms = int((time.monotonic() - self._started) * 1000)
+
+
+_current_usage: ContextVar[Optional[GenerationUsage]] = ContextVar("generation_usage", default=None)
+
+
+@contextmanager
+def track_usage():
+    usage = GenerationUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        usage.finish()
+        try:
+            _current_usage.reset(token)
+        except ValueError:
+            # Async generators may be finalized from another context
+            _current_usage.set(None)
+
+
+def current_usage() -> Optional[GenerationUsage]:
+    return _current_usage.get()
+
+
+def record_upstream_call(model: str):
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.model = model
+        usage.upstream_calls += 1
+
+
+def record_pool_hit():
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.pool_hit = True
+
+
+def record_generation_latency(seconds: float):
+    """Wall-clock time spent producing the questions, excluding our DB work."""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.upstream_latency_ms += int(seconds * 1000)
+
+
+def record_tokens(prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.prompt_tokens += prompt_tokens or 0
+        usage.completion_tokens += completion_tokens or 0
+
+
+def record_repair_call():
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.repair_calls += 1
+
+
+def record_invalid_question():
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.invalid_questions += 1
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values`` (0-100), or None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def usage_key(value):
+    # Day keys come back as dates from PostgreSQL and as ISO strings from SQLite
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def summarize_usage(rows, latencies: dict) -> List[dict]:
+    """Shape per-group usage aggregates and latency percentiles for the /usage report."""
+    empty = {"p50": None, "p95": None, "p99": None}
+    summary = []
+    for row in rows:
+        key = usage_key(row.key)
+        group_latencies = latencies.get(key, {})
+        summary.append({
+            "key": key,
+            "generations": row.generations,
+            "failed": int(row.failed),
+            "cache_served": int(row.cache_served),
+            "upstream_calls": int(row.upstream_calls),
+            "repair_calls": int(row.repair_calls),
+            "invalid_questions": int(row.invalid_questions),
+            "prompt_tokens": int(row.prompt_tokens),
+            "completion_tokens": int(row.completion_tokens),
+            "estimated_cost": round(float(row.estimated_cost), 6),
+            "upstream_latency_ms": group_latencies.get("upstream_latency_ms", empty),
+            "total_latency_ms": group_latencies.get("total_latency_ms", empty),
+        })
+    return summary
@@ -0,0 +1,210 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from app.services.generation_cache import CacheKey, make_cache_key
+from app.services.mistral_service import DEFAULT_QUESTIONS_COUNT, mistral_service
+from app.services.usage import record_pool_hit
+from crud.warm_pool_crud import (
+    add_warm_quiz,
+    count_fresh_warm_quizzes,
+    delete_expired_warm_quizzes,
+    list_trending_topics,
+    take_warm_quiz,
+    warm_quiz_exists,
+)
+from database.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Warm pool of pre-generated quizzes for trending topics:
+# - WARM_POOL_TOPICS: how many trending (topic, difficulty, language) triples to keep warm (0 disables)
+# - WARM_POOL_TRENDING_DAYS: window of quiz attempts used to rank topics
+# - WARM_POOL_VARIANTS: fresh quizzes kept per triple by the quiet-hours refresh
+# - WARM_POOL_MAX_VARIANTS: cap for on-demand refills once users have seen every variant
+# - WARM_POOL_TTL_HOURS: entries older than this are no longer served and get deleted
+# - WARM_POOL_QUIET_HOURS: UTC hour range "start-end" for the bulk refresh (empty = any time)
+# - WARM_POOL_INTERVAL_SECONDS: how often the builder wakes up
+WARM_POOL_TOPICS = int(os.getenv("WARM_POOL_TOPICS", "10"))
+WARM_POOL_TRENDING_DAYS = int(os.getenv("WARM_POOL_TRENDING_DAYS", "7"))
+WARM_POOL_VARIANTS = int(os.getenv("WARM_POOL_VARIANTS", "3"))
+WARM_POOL_MAX_VARIANTS = int(os.getenv("WARM_POOL_MAX_VARIANTS", "10"))
+WARM_POOL_TTL_HOURS = float(os.getenv("WARM_POOL_TTL_HOURS", "72"))
+WARM_POOL_QUIET_HOURS = os.getenv("WARM_POOL_QUIET_HOURS", "2-6")
+WARM_POOL_INTERVAL_SECONDS = float(os.getenv("WARM_POOL_INTERVAL_SECONDS", "600"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def in_quiet_hours(hour: int, quiet_hours: str = WARM_POOL_QUIET_HOURS) -> bool:
+    if not quiet_hours.strip():
+        return True
+    start, end = (int(part) % 24 for part in quiet_hours.split("-", 1))
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class WarmPool:
+    """Background builder and lookup for the pre-generated quiz pool.
+
+    During quiet hours the builder tops up the trending triples to
+    WARM_POOL_VARIANTS fresh quizzes each. A user who has already received every
+    fresh variant of a trending triple falls back to a live generation and
+    queues one more variant, at any hour, up to WARM_POOL_MAX_VARIANTS.
+    """
+
+    def __init__(self, topics: int = WARM_POOL_TOPICS):
+        self.topics = topics
+        self.metrics = {"hits": 0, "misses": 0, "built": 0, "build_failures": 0, "duplicates": 0}
+        self._trending: Dict[CacheKey, tuple] = {}
+        self._refills: asyncio.Queue = asyncio.Queue()
+        self._pending_refills: Set[CacheKey] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.topics > 0
+
+    async def start(self):
+        if self._task is not None or not self.enabled:
+            return
+        self._task = asyncio.create_task(self._run(), name="warm-pool-builder")
+        logger.info("Started warm pool builder for %d trending topic(s)", self.topics)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def take(
+        self,
+        db,
+        user_id: int,
+        topic: str,
+        difficulty: str,
+        language: str,
+        questions_count: int,
+    ) -> Optional[List[dict]]:
+        """Questions of a pooled quiz this user has never received, or None.
+
+        The delivery is recorded in ``db`` without committing, so it is only
+        kept if the caller saves the user's quiz in the same transaction.
+        """
+        if not self.enabled or questions_count != DEFAULT_QUESTIONS_COUNT:
+            return None
+        key = make_cache_key(topic, difficulty, language, questions_count)
+        entry = await take_warm_quiz(db, user_id, *key, since=self._fresh_since())
+        if entry is None:
+            self.metrics["misses"] += 1
+            if key in self._trending:
+                self.request_refill(key, (topic, difficulty, language))
+            return None
+        self.metrics["hits"] += 1
+        record_pool_hit()
+        return copy.deepcopy(entry.questions)
+
+    def request_refill(self, key: CacheKey, request: tuple):
+        if key in self._pending_refills:
+            return
+        self._pending_refills.add(key)
+        self._refills.put_nowait((key, request))
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "trending_topics": len(self._trending),
+            "pending_refills": len(self._pending_refills),
+        }
+
+    def _fresh_since(self) -> datetime:
+        return _utcnow() - timedelta(hours=WARM_POOL_TTL_HOURS)
+
+    async def _run(self):
+        while True:
+            try:
+                try:
+                    key, request = await asyncio.wait_for(
+                        self._refills.get(), timeout=WARM_POOL_INTERVAL_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    await self._refresh(fill=in_quiet_hours(_utcnow().hour))
+                    continue
+                try:
+                    await self._fill(key, request, WARM_POOL_MAX_VARIANTS, limit=1)
+                finally:
+                    self._pending_refills.discard(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Warm pool builder iteration failed")
+
+    async def _refresh(self, fill: bool):
+        """Re-rank trending topics; with ``fill``, also top up their variants."""
+        async with SessionLocal() as db:
+            expired = await delete_expired_warm_quizzes(db, self._fresh_since())
+            since = _utcnow() - timedelta(days=WARM_POOL_TRENDING_DAYS)
+            # Over-fetch: titles differing only by case or spacing share a key
+            rows = await list_trending_topics(db, since, limit=self.topics * 3)
+        if expired:
+            logger.info("Removed %d expired warm pool quiz(zes)", expired)
+
+        trending: Dict[CacheKey, tuple] = {}
+        for topic, difficulty, language in rows:
+            key = make_cache_key(topic, difficulty, language, DEFAULT_QUESTIONS_COUNT)
+            trending.setdefault(key, (topic, difficulty, language))
+            if len(trending) >= self.topics:
+                break
+        self._trending = trending
+
+        if not fill:
+            return
+        for key, request in trending.items():
+            await self._fill(key, request, WARM_POOL_VARIANTS)
+
+    async def _fill(self, key: CacheKey, request: tuple, target: int, limit: Optional[int] = None):
+        """Generate quizzes for ``key`` until it has ``target`` fresh entries (at most ``limit`` new)."""
+        async with SessionLocal() as db:
+            fresh = await count_fresh_warm_quizzes(db, *key, since=self._fresh_since())
+        missing = max(0, target - fresh)
+        if limit is not None:
+            missing = min(missing, limit)
+
+        topic, difficulty, language = request
+        for _ in range(missing):
+            # Never compete with users for upstream capacity while it is failing
+            if mistral_service.breaker.retry_after() > 0:
+                return
+            try:
+                # Bypass the generation cache: every variant must be a fresh quiz
+                quiz_data = await mistral_service.generate_quiz(topic, difficulty, language, key[3])
+            except Exception as exc:
+                self.metrics["build_failures"] += 1
+                logger.warning("Warm pool generation failed for %r: %r", key, exc)
+                return
+            questions = quiz_data.get("quiz", {}).get("questions") or []
+            if "error" in quiz_data or len(questions) < key[3]:
+                self.metrics["build_failures"] += 1
+                continue
+            fingerprint = hashlib.sha1(json.dumps(questions, sort_keys=True).encode("utf-8")).hexdigest()
+            async with SessionLocal() as db:
+                # An identical variant would let a user receive the same quiz twice
+                if await warm_quiz_exists(db, *key, fingerprint=fingerprint):
+                    self.metrics["duplicates"] += 1
+                    return
+                await add_warm_quiz(
+                    db, *key[:3], questions_count=key[3], questions=questions, fingerprint=fingerprint
+                )
+            self.metrics["built"] += 1
+
+
+warm_pool = WarmPool()
@@ -0,0 +1,39 @@
+"""
+Backfill: build MinHash/LSH question fingerprints for quizzes created before
+near-duplicate detection existed. Safe to re-run; only unindexed quizzes are
+processed.
+  python backfill_question_fingerprints.py
+"""
+import asyncio
+
+from crud.question_fingerprint_crud import index_quiz_questions, list_unindexed_quiz_ids
+from database.database import Base, SessionLocal, engine
+from database.models import Quiz
+
+BATCH_SIZE = 500
+
+
+async def backfill():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    indexed = 0
+    last_id = 0
+    while True:
+        async with SessionLocal() as db:
+            quiz_ids = await list_unindexed_quiz_ids(db, after_id=last_id, limit=BATCH_SIZE)
+            if not quiz_ids:
+                break
+            for quiz_id in quiz_ids:
+                quiz = await db.get(Quiz, quiz_id)
+                await index_quiz_questions(db, quiz)
+            await db.commit()
+        indexed += len(quiz_ids)
+        last_id = quiz_ids[-1]
+        print(f"Indexed {indexed} quizzes...")
+
+    await engine.dispose()
+    print(f"Backfill complete: {indexed} quizzes indexed.")
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
@@ -0,0 +1,27 @@
+"""
+Backfill: build full-text search documents for every quiz. The API runs this
+on startup while the search index is empty; run it by hand to re-index after
+changing the search configuration. Safe to re-run; every quiz is re-indexed.
+  python backfill_quiz_search.py
+"""
+import asyncio
+import logging
+
+from app.services.backfills import rebuild_quiz_search
+from crud.quiz_search_crud import create_search_index
+from database.database import Base, engine
+
+
+async def backfill():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await create_search_index(conn)
+
+    indexed = await rebuild_quiz_search()
+
+    await engine.dispose()
+    print(f"Backfill complete: {indexed} quizzes indexed.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(backfill())
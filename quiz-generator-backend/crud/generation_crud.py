@@ -0,0 +1,116 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.usage import percentile, usage_key
+from database.models import Generation
+
+# Outside PostgreSQL, latency percentiles are computed in Python from at most
+# this many of the most recent generations in the window
+LATENCY_SAMPLE_LIMIT = 10000
+
+USAGE_PERCENTILES = (50, 95, 99)
+_LATENCY_COLUMNS = {
+    "upstream_latency_ms": Generation.upstream_latency_ms,
+    "total_latency_ms": Generation.total_latency_ms,
+}
+
+
+def _usage_group_key(group_by: str):
+    if group_by == "day":
+        return func.date(Generation.created_at)
+    if group_by == "user":
+        return Generation.user_id
+    return func.coalesce(
+        Generation.model,
+        case((Generation.source == "cache", "cache"), else_="unknown"),
+    )
+
+
+def _usage_filters(since: datetime, user_id: Optional[int]) -> list:
+    conditions = [Generation.created_at >= since]
+    if user_id is not None:
+        conditions.append(Generation.user_id == user_id)
+    return conditions
+
+
+def _sum(column):
+    return func.coalesce(func.sum(column), 0)
+
+
+async def aggregate_generation_usage(
+    db: AsyncSession,
+    since: datetime,
+    group_by: str,
+    user_id: Optional[int] = None,
+):
+    """Counts and token/cost sums of generations since ``since``, one row per group."""
+    key = _usage_group_key(group_by).label("key")
+    result = await db.execute(
+        select(
+            key,
+            func.count(Generation.id).label("generations"),
+            _sum(case((Generation.outcome != "success", 1), else_=0)).label("failed"),
+            _sum(case((Generation.source == "cache", 1), else_=0)).label("cache_served"),
+            _sum(Generation.upstream_calls).label("upstream_calls"),
+            _sum(Generation.repair_calls).label("repair_calls"),
+            _sum(Generation.invalid_questions).label("invalid_questions"),
+            _sum(Generation.prompt_tokens).label("prompt_tokens"),
+            _sum(Generation.completion_tokens).label("completion_tokens"),
+            _sum(Generation.estimated_cost).label("estimated_cost"),
+        )
+        .where(*_usage_filters(since, user_id))
+        .group_by(key)
+        .order_by(key)
+    )
+    return result.all()
+
+
+async def generation_latency_percentiles(
+    db: AsyncSession,
+    since: datetime,
+    group_by: str,
+    user_id: Optional[int] = None,
+) -> Dict[object, Dict[str, Dict[str, Optional[int]]]]:
+    """Nearest-rank latency percentiles per group, keyed like aggregate_generation_usage."""
+    key = _usage_group_key(group_by).label("key")
+    if db.bind.dialect.name == "postgresql":
+        # percentile_disc is the nearest-rank percentile; NULL latencies are ignored
+        columns = [
+            func.percentile_disc(pct / 100).within_group(column).label(f"{name}_p{pct}")
+            for name, column in _LATENCY_COLUMNS.items()
+            for pct in USAGE_PERCENTILES
+        ]
+        result = await db.execute(
+            select(key, *columns).where(*_usage_filters(since, user_id)).group_by(key)
+        )
+        return {
+            usage_key(row.key): {
+                name: {f"p{pct}": getattr(row, f"{name}_p{pct}") for pct in USAGE_PERCENTILES}
+                for name in _LATENCY_COLUMNS
+            }
+            for row in result.all()
+        }
+
+    result = await db.execute(
+        select(key, *_LATENCY_COLUMNS.values())
+        .where(*_usage_filters(since, user_id))
+        .order_by(Generation.created_at.desc())
+        .limit(LATENCY_SAMPLE_LIMIT)
+    )
+    samples: Dict[object, Dict[str, List[int]]] = {}
+    for row in result.all():
+        group = samples.setdefault(usage_key(row.key), {name: [] for name in _LATENCY_COLUMNS})
+        for name in _LATENCY_COLUMNS:
+            value = getattr(row, name)
+            if value is not None:
+                group[name].append(value)
+    return {
+        group_key: {
+            name: {f"p{pct}": percentile(values, pct) for pct in USAGE_PERCENTILES}
+            for name, values in group.items()
+        }
+        for group_key, group in samples.items()
+    }
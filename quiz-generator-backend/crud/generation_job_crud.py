@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import GenerationJob
+
+ACTIVE_JOB_STATUSES = ("pending", "running")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def create_generation_job(
+    db: AsyncSession,
+    user_id: int,
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions_count: int = 5,
+):
+    job = GenerationJob(
+        user_id=user_id,
+        topic=topic,
+        difficulty=difficulty,
+        language=language,
+        questions_count=questions_count,
+        status="pending",
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def get_generation_job(db: AsyncSession, job_id: int):
+    return await db.get(GenerationJob, job_id)
+
+
+async def count_active_jobs(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(
+        select(func.count(GenerationJob.id)).where(
+            GenerationJob.user_id == user_id,
+            GenerationJob.status.in_(ACTIVE_JOB_STATUSES),
+        )
+    )
+    return int(result.scalar() or 0)
+
+
+async def list_pending_job_ids(db: AsyncSession, limit: int = 100) -> List[int]:
+    result = await db.execute(
+        select(GenerationJob.id)
+        .where(GenerationJob.status == "pending")
+        .order_by(GenerationJob.created_at.asc(), GenerationJob.id.asc())
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def claim_generation_job(db: AsyncSession, job_id: int) -> Optional[GenerationJob]:
+    """Atomically move a pending job to running; returns None if another worker got it."""
+    now = _utcnow()
+    result = await db.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == job_id, GenerationJob.status == "pending")
+        .values(
+            status="running",
+            attempts=GenerationJob.attempts + 1,
+            started_at=now,
+            heartbeat_at=now,
+        )
+    )
+    await db.commit()
+    if result.rowcount != 1:
+        return None
+    job = await db.get(GenerationJob, job_id)
+    await db.refresh(job)
+    return job
+
+
+async def heartbeat_generation_job(db: AsyncSession, job: GenerationJob) -> bool:
+    """Mark ``job``'s current attempt as still alive; commits. False once it was requeued."""
+    result = await db.execute(
+        update(GenerationJob)
+        .where(
+            GenerationJob.id == job.id,
+            GenerationJob.status == "running",
+            GenerationJob.attempts == job.attempts,
+        )
+        .values(heartbeat_at=_utcnow())
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def requeue_stale_jobs(db: AsyncSession, stale_after_seconds: float) -> int:
+    """Return running jobs whose worker stopped heartbeating (e.g. after a crash or restart) to pending."""
+    cutoff = _utcnow() - timedelta(seconds=stale_after_seconds)
+    result = await db.execute(
+        update(GenerationJob)
+        .where(GenerationJob.status == "running", GenerationJob.heartbeat_at < cutoff)
+        .values(status="pending", started_at=None, heartbeat_at=None)
+    )
+    await db.commit()
+    return result.rowcount or 0
+
+
+async def mark_job_succeeded(db: AsyncSession, job: GenerationJob, quiz_id: int) -> bool:
+    """Stage the success of ``job``'s current attempt; the caller commits.
+
+    Returns False if the job was requeued or claimed again meanwhile, in which
+    case the caller should roll back instead of saving a second quiz.
+    """
+    result = await db.execute(
+        update(GenerationJob)
+        .where(
+            GenerationJob.id == job.id,
+            GenerationJob.status == "running",
+            GenerationJob.attempts == job.attempts,
+        )
+        .values(status="succeeded", quiz_id=quiz_id, error=None, finished_at=_utcnow())
+    )
+    return result.rowcount == 1
+
+
+def mark_job_failed(job: GenerationJob, error: str):
+    job.status = "failed"
+    job.error = error[:500]
+    job.finished_at = _utcnow()
@@ -0,0 +1,56 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import case, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import GenerationQuota
+
+
+async def get_quota_used(db: AsyncSession, user_id: int, day: date) -> Optional[int]:
+    result = await db.execute(
+        select(GenerationQuota.used).where(
+            GenerationQuota.user_id == user_id,
+            GenerationQuota.day == day,
+        )
+    )
+    return result.scalar()
+
+
+async def create_quota_row(db: AsyncSession, user_id: int, day: date, used: int = 0):
+    """Insert the day's counter unless a concurrent request already did."""
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    await db.execute(
+        insert(GenerationQuota)
+        .values(user_id=user_id, day=day, used=used)
+        .on_conflict_do_nothing(index_elements=["user_id", "day"])
+    )
+
+
+async def increment_quota(db: AsyncSession, user_id: int, day: date, limit: int) -> bool:
+    """Take one slot if the counter is below ``limit``; False when full or missing."""
+    result = await db.execute(
+        update(GenerationQuota)
+        .where(
+            GenerationQuota.user_id == user_id,
+            GenerationQuota.day == day,
+            GenerationQuota.used < limit,
+        )
+        .values(used=GenerationQuota.used + 1)
+    )
+    return result.rowcount == 1
+
+
+async def decrement_quota(db: AsyncSession, user_id: int, day: date, count: int = 1):
+    """Give back ``count`` slots, clamping the counter at zero."""
+    await db.execute(
+        update(GenerationQuota)
+        .where(
+            GenerationQuota.user_id == user_id,
+            GenerationQuota.day == day,
+        )
+        # greatest(used - count, 0), spelled portably for SQLite
+        .values(used=case((GenerationQuota.used > count, GenerationQuota.used - count), else_=0))
+    )
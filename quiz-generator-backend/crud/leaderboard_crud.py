@@ -0,0 +1,186 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.quiz_stats_crud import score_percent
+from database.models import LeaderboardEntry, Quiz, User, UserScore
+
+ALL_TIME = "all"
+
+
+def week_period(at: datetime) -> str:
+    year, week, _ = at.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+async def _lock_users(db: AsyncSession, user_ids: Iterable[int]):
+    """Serialize leaderboard writes per user until the transaction ends.
+
+    Incremental upserts and full refreshes of the same user both take this
+    lock first, so a refresh can never delete an attempt recorded
+    concurrently, nor an attempt be added on top of a refresh that already
+    counted it. FOR NO KEY UPDATE does not block inserts referencing the
+    users; SQLite ignores it and serializes writers anyway.
+    """
+    await db.execute(
+        select(User.id)
+        .where(User.id.in_(sorted(user_ids)))
+        .order_by(User.id)
+        .with_for_update(key_share=True)
+    )
+
+
+async def record_leaderboard_attempt(
+    db: AsyncSession,
+    user_id: int,
+    difficulty: str,
+    percent: int,
+    at: datetime,
+):
+    """Stage one attempt into the all-time and weekly entries; the caller commits."""
+    await _lock_users(db, [user_id])
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    for period in (ALL_TIME, week_period(at)):
+        stmt = insert(LeaderboardEntry).values(
+            difficulty=difficulty,
+            period=period,
+            user_id=user_id,
+            attempts=1,
+            score_sum=percent,
+            best_score=percent,
+            best_at=at,
+        )
+        improved = stmt.excluded.best_score > LeaderboardEntry.best_score
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LeaderboardEntry.difficulty, LeaderboardEntry.period, LeaderboardEntry.user_id],
+            set_={
+                "attempts": LeaderboardEntry.attempts + 1,
+                "score_sum": LeaderboardEntry.score_sum + stmt.excluded.score_sum,
+                "best_score": case((improved, stmt.excluded.best_score), else_=LeaderboardEntry.best_score),
+                "best_at": case((improved, stmt.excluded.best_at), else_=LeaderboardEntry.best_at),
+            },
+        )
+        await db.execute(stmt)
+
+
+async def refresh_user_leaderboards(db: AsyncSession, user_ids: Iterable[int]):
+    """Recompute every entry of ``user_ids`` from their scores; the caller commits.
+
+    Used when scores are edited or removed, or a quiz changes difficulty.
+    """
+    user_ids = list({user_id for user_id in user_ids if user_id is not None})
+    if not user_ids:
+        return
+    await _lock_users(db, user_ids)
+    result = await db.execute(
+        select(
+            UserScore.user_id,
+            UserScore.score,
+            UserScore.max_score,
+            UserScore.created_at,
+            Quiz.difficulty,
+        )
+        .join(Quiz, UserScore.quiz_id == Quiz.id)
+        .where(UserScore.user_id.in_(user_ids), Quiz.difficulty.is_not(None))
+        .order_by(UserScore.created_at, UserScore.id)
+    )
+    entries: Dict[Tuple[str, str, int], LeaderboardEntry] = {}
+    for row in result.all():
+        percent = score_percent(row.score, row.max_score)
+        for period in (ALL_TIME, week_period(row.created_at)):
+            key = (row.difficulty, period, row.user_id)
+            entry = entries.get(key)
+            if entry is None:
+                entries[key] = LeaderboardEntry(
+                    difficulty=row.difficulty,
+                    period=period,
+                    user_id=row.user_id,
+                    attempts=1,
+                    score_sum=percent,
+                    best_score=percent,
+                    best_at=row.created_at,
+                )
+                continue
+            entry.attempts += 1
+            entry.score_sum += percent
+            # Scores are walked oldest first, so equal scores keep the earlier time
+            if percent > entry.best_score:
+                entry.best_score = percent
+                entry.best_at = row.created_at
+
+    await db.execute(delete(LeaderboardEntry).where(LeaderboardEntry.user_id.in_(user_ids)))
+    db.add_all(entries.values())
+    await db.flush()
+
+
+async def list_score_user_ids(db: AsyncSession, quiz_ids: Iterable[int]):
+    """Users with at least one score on any of ``quiz_ids``."""
+    quiz_ids = list(quiz_ids)
+    if not quiz_ids:
+        return []
+    result = await db.execute(
+        select(UserScore.user_id).where(UserScore.quiz_id.in_(quiz_ids)).distinct()
+    )
+    return result.scalars().all()
+
+
+async def delete_user_leaderboards(db: AsyncSession, user_id: int):
+    await db.execute(delete(LeaderboardEntry).where(LeaderboardEntry.user_id == user_id))
+
+
+def _ranking():
+    return (
+        LeaderboardEntry.best_score.desc(),
+        LeaderboardEntry.best_at.asc(),
+        LeaderboardEntry.user_id.asc(),
+    )
+
+
+async def list_leaderboard(db: AsyncSession, difficulty: str, period: str, limit: int):
+    result = await db.execute(
+        select(LeaderboardEntry, User.username)
+        .join(User, LeaderboardEntry.user_id == User.id)
+        .where(LeaderboardEntry.difficulty == difficulty, LeaderboardEntry.period == period)
+        .order_by(*_ranking())
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def get_leaderboard_entry(
+    db: AsyncSession,
+    difficulty: str,
+    period: str,
+    user_id: int,
+) -> Optional[LeaderboardEntry]:
+    return await db.get(LeaderboardEntry, (difficulty, period, user_id))
+
+
+async def get_leaderboard_rank(db: AsyncSession, entry: LeaderboardEntry) -> int:
+    """1-based position of ``entry``: one more than the entries ranked ahead of it."""
+    ahead = await db.execute(
+        select(func.count())
+        .select_from(LeaderboardEntry)
+        .where(
+            LeaderboardEntry.difficulty == entry.difficulty,
+            LeaderboardEntry.period == entry.period,
+            or_(
+                LeaderboardEntry.best_score > entry.best_score,
+                and_(
+                    LeaderboardEntry.best_score == entry.best_score,
+                    or_(
+                        LeaderboardEntry.best_at < entry.best_at,
+                        and_(
+                            LeaderboardEntry.best_at == entry.best_at,
+                            LeaderboardEntry.user_id < entry.user_id,
+                        ),
+                    ),
+                ),
+            ),
+        )
+    )
+    return (ahead.scalar() or 0) + 1
@@ -0,0 +1,95 @@
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.question_dedup import pack_signature, question_fingerprint
+from database.models import QuestionFingerprint, QuestionLshBucket, Quiz
+
+
+async def index_quiz_questions(db: AsyncSession, quiz: Quiz):
+    """Stage fingerprints and LSH buckets for every question of ``quiz``; the caller commits."""
+    fingerprints = []
+    for position, question in enumerate(quiz.questions or []):
+        if not isinstance(question, dict):
+            continue
+        fingerprint = question_fingerprint(question)
+        row = QuestionFingerprint(
+            quiz_id=quiz.id,
+            position=position,
+            signature=pack_signature(fingerprint.signature),
+        )
+        fingerprints.append((row, fingerprint.buckets))
+    if not fingerprints:
+        return
+    db.add_all([row for row, _ in fingerprints])
+    await db.flush()
+    db.add_all([
+        QuestionLshBucket(bucket=bucket, fingerprint_id=row.id)
+        for row, buckets in fingerprints
+        # Bands of a very short question can collide; keep one row per bucket
+        for bucket in set(buckets)
+    ])
+
+
+async def delete_quiz_fingerprints(db: AsyncSession, quiz_ids: Iterable[int]):
+    quiz_ids = list(quiz_ids)
+    if not quiz_ids:
+        return
+    fingerprint_ids = select(QuestionFingerprint.id).where(QuestionFingerprint.quiz_id.in_(quiz_ids))
+    await db.execute(delete(QuestionLshBucket).where(QuestionLshBucket.fingerprint_id.in_(fingerprint_ids)))
+    await db.execute(delete(QuestionFingerprint).where(QuestionFingerprint.quiz_id.in_(quiz_ids)))
+
+
+async def find_fingerprint_candidates(
+    db: AsyncSession,
+    buckets: Iterable[int],
+    owner_id: Optional[int] = None,
+):
+    """Fingerprints sharing at least one bucket, with the bucket that matched."""
+    buckets = list(set(buckets))
+    if not buckets:
+        return []
+    q = (
+        select(
+            QuestionLshBucket.bucket,
+            QuestionFingerprint.id,
+            QuestionFingerprint.quiz_id,
+            QuestionFingerprint.position,
+            QuestionFingerprint.signature,
+        )
+        .join(QuestionFingerprint, QuestionFingerprint.id == QuestionLshBucket.fingerprint_id)
+        .where(QuestionLshBucket.bucket.in_(buckets))
+    )
+    if owner_id is not None:
+        q = q.join(Quiz, Quiz.id == QuestionFingerprint.quiz_id).where(Quiz.owner_id == owner_id)
+    result = await db.execute(q)
+    return result.all()
+
+
+async def list_owner_fingerprints(db: AsyncSession, owner_id: int):
+    """Every (bucket, fingerprint) of the owner's quizzes, for cluster reports."""
+    result = await db.execute(
+        select(
+            QuestionLshBucket.bucket,
+            QuestionFingerprint.id,
+            QuestionFingerprint.quiz_id,
+            QuestionFingerprint.position,
+            QuestionFingerprint.signature,
+        )
+        .join(QuestionFingerprint, QuestionFingerprint.id == QuestionLshBucket.fingerprint_id)
+        .join(Quiz, Quiz.id == QuestionFingerprint.quiz_id)
+        .where(Quiz.owner_id == owner_id)
+    )
+    return result.all()
+
+
+async def list_unindexed_quiz_ids(db: AsyncSession, after_id: int = 0, limit: int = 500) -> List[int]:
+    indexed = select(QuestionFingerprint.quiz_id)
+    result = await db.execute(
+        select(Quiz.id)
+        .where(Quiz.id > after_id, Quiz.id.not_in(indexed))
+        .order_by(Quiz.id)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
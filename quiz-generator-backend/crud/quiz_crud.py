@@ -1,28 +1,133 @@
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
 from sqlalchemy import update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Quiz
 from sqlalchemy.sql import select
 
+from crud.leaderboard_crud import list_score_user_ids, refresh_user_leaderboards
+from crud.question_fingerprint_crud import delete_quiz_fingerprints, index_quiz_questions
+from crud.quiz_search_crud import delete_quiz_search, index_quiz_search
+from crud.quiz_stats_crud import delete_quiz_stats
+
+# Columns that feed the full-text search document
+SEARCH_FIELDS = {"title", "description", "language", "questions"}
+
+# Everything list views need; never includes the questions JSON
+QUIZ_SUMMARY_COLUMNS = (
+    Quiz.id,
+    Quiz.title,
+    Quiz.description,
+    Quiz.language,
+    Quiz.difficulty,
+    Quiz.questions_count,
+    Quiz.owner_id,
+    Quiz.is_public,
+    Quiz.created_at,
+)
+
+def _with_questions_count(quiz_data: dict) -> dict:
+    if "questions" not in quiz_data:
+        return quiz_data
+    return {**quiz_data, "questions_count": len(quiz_data["questions"] or [])}
+
 async def create_quiz(db: AsyncSession, quiz_data: dict):
-    new_quiz = Quiz(**quiz_data)
+    new_quiz = Quiz(**_with_questions_count(quiz_data))
     db.add(new_quiz)
+    await db.flush()
+    await index_quiz_questions(db, new_quiz)
+    await index_quiz_search(db, new_quiz)
     await db.commit()
     await db.refresh(new_quiz)
     return new_quiz
 
+async def create_quizzes(db: AsyncSession, quizzes_data: list):
+    """Stage several quizzes in the current transaction; the caller commits."""
+    new_quizzes = [Quiz(**_with_questions_count(quiz_data)) for quiz_data in quizzes_data]
+    db.add_all(new_quizzes)
+    await db.flush()
+    for quiz in new_quizzes:
+        await index_quiz_questions(db, quiz)
+        await index_quiz_search(db, quiz)
+    return new_quizzes
+
 async def get_quiz(db: AsyncSession, quiz_id: int):
     return await db.get(Quiz, quiz_id)
 
-async def get_all_quizzes(db: AsyncSession):
-    result = await db.execute(select(Quiz))
-    return result.scalars().all()
+async def get_quiz_version(db: AsyncSession, quiz_id: int):
+    """Ownership, visibility and updated_at of a quiz, without loading its questions."""
+    result = await db.execute(
+        select(Quiz.id, Quiz.owner_id, Quiz.is_public, Quiz.updated_at).where(Quiz.id == quiz_id)
+    )
+    return result.first()
+
+def quiz_filters(
+    difficulty: Optional[str] = None,
+    language: Optional[str] = None,
+    is_public: Optional[bool] = None,
+    owner_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> list:
+    conditions = []
+    if difficulty is not None:
+        conditions.append(Quiz.difficulty == difficulty)
+    if language is not None:
+        conditions.append(Quiz.language == language)
+    if is_public is not None:
+        conditions.append(Quiz.is_public == is_public)
+    if owner_id is not None:
+        conditions.append(Quiz.owner_id == owner_id)
+    if after_id is not None:
+        conditions.append(Quiz.id > after_id)
+    return conditions
+
+async def list_quiz_summaries(db: AsyncSession, conditions: Sequence, order_by: Sequence = (Quiz.id,), limit: Optional[int] = None):
+    query = select(*QUIZ_SUMMARY_COLUMNS).where(*conditions).order_by(*order_by)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return result.all()
+
+async def stream_quiz_rows(db: AsyncSession, columns: Sequence, conditions: Sequence, batch_size: int = 500):
+    """Yield the selected columns of matching quizzes in id order, ``batch_size`` rows at a time.
+
+    Uses a server-side cursor where the driver supports one, so memory stays
+    bounded by the batch size rather than the table size.
+    """
+    result = await db.stream(
+        select(*columns)
+        .where(*conditions)
+        .order_by(Quiz.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for row in result:
+        yield row
 
 async def update_quiz(db: AsyncSession, quiz_id: int, update_data: dict):
+    update_data = _with_questions_count(update_data)
+    previous_difficulty = None
+    if "difficulty" in update_data:
+        result = await db.execute(select(Quiz.difficulty).where(Quiz.id == quiz_id))
+        previous_difficulty = result.scalar()
     await db.execute(
         update(Quiz)
         .where(Quiz.id == quiz_id)
-        .values(**update_data)
+        # Stamped here rather than by the database so it has microsecond
+        # precision on every backend; quiz ETags are derived from it
+        .values(**update_data, updated_at=datetime.now(timezone.utc).replace(tzinfo=None))
     )
+    if "difficulty" in update_data and update_data["difficulty"] != previous_difficulty:
+        # Past attempts now count towards another leaderboard
+        await refresh_user_leaderboards(db, await list_score_user_ids(db, [quiz_id]))
+    if SEARCH_FIELDS & update_data.keys():
+        quiz = await get_quiz(db, quiz_id)
+        if quiz is not None:
+            await db.refresh(quiz, list(SEARCH_FIELDS))
+            if "questions" in update_data:
+                await delete_quiz_fingerprints(db, [quiz_id])
+                await index_quiz_questions(db, quiz)
+            await index_quiz_search(db, quiz)
     await db.commit()
     return await get_quiz(db, quiz_id)
 
@@ -33,7 +138,12 @@ async def delete_quiz(db: AsyncSession, quiz_id: int):
 
     # Remove dependent rows in user_scores to prevent FK violation
     from database.models import UserScore
+    player_ids = await list_score_user_ids(db, [quiz_id])
     await db.execute(delete(UserScore).where(UserScore.quiz_id == quiz_id))
+    await delete_quiz_stats(db, [quiz_id])
+    await refresh_user_leaderboards(db, player_ids)
+    await delete_quiz_fingerprints(db, [quiz_id])
+    await delete_quiz_search(db, [quiz_id])
 
     await db.delete(quiz)
     try:
@@ -0,0 +1,188 @@
+import re
+from typing import Iterable, List, Optional
+
+from sqlalchemy import column, delete, func, literal_column, select, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from database.models import Quiz
+
+# Full-text index over quiz titles, descriptions and question text, kept in a
+# dialect-specific table outside the ORM models:
+# - PostgreSQL: quiz_search(quiz_id, document, full_document) with GIN-indexed
+#   tsvectors. Each text is indexed with the quiz language's stemming config
+#   and with 'simple', so prefix matches work whatever language the searcher
+#   filters on. document holds title (weight A) and description (B);
+#   full_document adds the questions (D).
+# - SQLite: an FTS5 virtual table keyed by rowid = quiz id.
+
+# Built-in PostgreSQL text search configurations for the quiz languages offered
+# in the UI; other languages (Japanese, Chinese, Korean, Hindi, Polish) are
+# only indexed with 'simple'.
+SEARCH_CONFIGS = {
+    "english": "english",
+    "spanish": "spanish",
+    "french": "french",
+    "german": "german",
+    "italian": "italian",
+    "portuguese": "portuguese",
+    "dutch": "dutch",
+    "russian": "russian",
+    "turkish": "turkish",
+    "arabic": "arabic",
+}
+
+# Search input beyond this many words is ignored
+MAX_SEARCH_TERMS = 8
+
+_pg_search = table("quiz_search", column("quiz_id"), column("document"), column("full_document"))
+_sqlite_search = table("quiz_search", column("rowid"))
+
+
+def search_config(language: Optional[str]) -> str:
+    return SEARCH_CONFIGS.get((language or "").strip().lower(), "simple")
+
+
+def search_terms(search: Optional[str]) -> List[str]:
+    return re.findall(r"\w+", (search or "").lower())[:MAX_SEARCH_TERMS]
+
+
+def _questions_text(questions) -> str:
+    parts = []
+    for question in questions or []:
+        if not isinstance(question, dict):
+            continue
+        parts.append(str(question.get("question") or ""))
+        parts.extend(str(option) for option in question.get("options") or [])
+    return "\n".join(parts)
+
+
+async def create_search_index(conn: AsyncConnection):
+    """Create the search table and its indexes if missing."""
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS quiz_search (
+                quiz_id INTEGER PRIMARY KEY REFERENCES quizzes (id) ON DELETE CASCADE,
+                document TSVECTOR NOT NULL,
+                full_document TSVECTOR NOT NULL
+            )
+            """
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_quiz_search_document ON quiz_search USING GIN (document)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_quiz_search_full_document ON quiz_search USING GIN (full_document)"
+        ))
+    elif conn.dialect.name == "sqlite":
+        await conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS quiz_search "
+            "USING fts5(title, description, questions, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+
+
+def _regconfig(config: str):
+    # Only called with 'simple' or a SEARCH_CONFIGS value, so inlining is safe
+    return literal_column(f"'{config}'::regconfig")
+
+
+def _pg_tsvector(config: str, param: str, weight: str) -> str:
+    return (
+        f"setweight(to_tsvector('{config}'::regconfig, :{param}) "
+        f"|| to_tsvector('simple'::regconfig, :{param}), '{weight}')"
+    )
+
+
+async def index_quiz_search(db: AsyncSession, quiz: Quiz):
+    """Stage the search document of ``quiz``, replacing any previous one; the caller commits."""
+    params = {
+        "quiz_id": quiz.id,
+        "title": quiz.title or "",
+        "description": quiz.description or "",
+        "questions": _questions_text(quiz.questions),
+    }
+    if db.bind.dialect.name == "postgresql":
+        config = search_config(quiz.language)
+        document = f"{_pg_tsvector(config, 'title', 'A')} || {_pg_tsvector(config, 'description', 'B')}"
+        await db.execute(text(
+            f"""
+            INSERT INTO quiz_search (quiz_id, document, full_document)
+            SELECT CAST(:quiz_id AS INTEGER), d.document, d.document || {_pg_tsvector(config, 'questions', 'D')}
+            FROM (SELECT {document} AS document) AS d
+            ON CONFLICT (quiz_id) DO UPDATE
+            SET document = EXCLUDED.document, full_document = EXCLUDED.full_document
+            """
+        ), params)
+    elif db.bind.dialect.name == "sqlite":
+        await db.execute(text("DELETE FROM quiz_search WHERE rowid = :quiz_id"), params)
+        await db.execute(text(
+            "INSERT INTO quiz_search (rowid, title, description, questions) "
+            "VALUES (:quiz_id, :title, :description, :questions)"
+        ), params)
+
+
+async def reindex_quizzes(db: AsyncSession, quiz_ids: Iterable[int]):
+    """Stage fresh search documents for ``quiz_ids``; the caller commits."""
+    result = await db.execute(select(Quiz).where(Quiz.id.in_(list(quiz_ids))))
+    for quiz in result.scalars().all():
+        await index_quiz_search(db, quiz)
+
+
+async def search_index_is_empty(db: AsyncSession) -> bool:
+    result = await db.execute(select(text("1")).select_from(table("quiz_search")).limit(1))
+    return result.first() is None
+
+
+async def delete_quiz_search(db: AsyncSession, quiz_ids: Iterable[int]):
+    quiz_ids = list(quiz_ids)
+    if not quiz_ids:
+        return
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(delete(_pg_search).where(_pg_search.c.quiz_id.in_(quiz_ids)))
+    elif db.bind.dialect.name == "sqlite":
+        await db.execute(delete(_sqlite_search).where(_sqlite_search.c.rowid.in_(quiz_ids)))
+
+
+def search_matches(
+    dialect: str,
+    search: str,
+    language: Optional[str] = None,
+    include_questions: bool = False,
+):
+    """Subquery of (quiz_id, rank) for quizzes matching every word of ``search``, or None.
+
+    Each word also matches as a prefix. Higher rank is more relevant.
+    ``language`` picks the stemming used for the search words.
+    """
+    terms = search_terms(search)
+    if not terms:
+        return None
+    if dialect == "postgresql":
+        document = _pg_search.c.full_document if include_questions else _pg_search.c.document
+        query_text = " & ".join(f"{term}:*" for term in terms)
+        tsquery = func.to_tsquery(_regconfig("simple"), query_text)
+        config = search_config(language)
+        if config != "simple":
+            tsquery = func.to_tsquery(_regconfig(config), query_text).op("||")(tsquery)
+        return (
+            select(
+                _pg_search.c.quiz_id.label("quiz_id"),
+                func.ts_rank(document, tsquery).label("rank"),
+            )
+            .where(document.op("@@")(tsquery))
+            .subquery("search_matches")
+        )
+    if dialect == "sqlite":
+        query_text = " ".join(f'"{term}"*' for term in terms)
+        if not include_questions:
+            query_text = f"{{title description}} : ({query_text})"
+        return (
+            select(
+                _sqlite_search.c.rowid.label("quiz_id"),
+                # bm25 is lower-is-better; weights favour title over description over questions
+                (-literal_column("bm25(quiz_search, 10.0, 4.0, 1.0)")).label("rank"),
+            )
+            .where(text("quiz_search MATCH :search_query").bindparams(search_query=query_text))
+            .subquery("search_matches")
+        )
+    return None
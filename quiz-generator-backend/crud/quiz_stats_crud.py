@@ -0,0 +1,106 @@
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import QuizStats, UserScore
+
+# Same percentage as the historical per-request aggregates
+_score_percent = case(
+    (UserScore.max_score > 0, UserScore.score * 100 / UserScore.max_score),
+    else_=0,
+)
+
+
+def score_percent(score: Optional[int], max_score: Optional[int]) -> int:
+    if not max_score or max_score <= 0:
+        return 0
+    return (score or 0) * 100 // max_score
+
+
+async def record_attempt(db: AsyncSession, quiz_id: int, score: Optional[int], max_score: Optional[int]):
+    """Stage one more attempt on ``quiz_id``; the caller commits with the score row."""
+    percent = score_percent(score, max_score)
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(QuizStats).values(
+        quiz_id=quiz_id,
+        attempts=1,
+        score_sum=percent,
+        best_score=percent,
+        last_attempt_at=func.now(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[QuizStats.quiz_id],
+        set_={
+            "attempts": QuizStats.attempts + 1,
+            "score_sum": QuizStats.score_sum + stmt.excluded.score_sum,
+            "best_score": case(
+                (stmt.excluded.best_score > QuizStats.best_score, stmt.excluded.best_score),
+                else_=QuizStats.best_score,
+            ),
+            "last_attempt_at": stmt.excluded.last_attempt_at,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def refresh_quiz_stats(db: AsyncSession, quiz_ids: Iterable[int]):
+    """Recompute the stats of ``quiz_ids`` from user_scores; the caller commits.
+
+    Used when attempts are edited or removed, where a running total cannot be
+    adjusted (best score, last attempt).
+    """
+    quiz_ids = list({quiz_id for quiz_id in quiz_ids if quiz_id is not None})
+    if not quiz_ids:
+        return
+    result = await db.execute(
+        select(
+            UserScore.quiz_id,
+            func.count(UserScore.id).label("attempts"),
+            func.coalesce(func.sum(_score_percent), 0).label("score_sum"),
+            func.coalesce(func.max(_score_percent), 0).label("best_score"),
+            func.max(UserScore.created_at).label("last_attempt_at"),
+        )
+        .where(UserScore.quiz_id.in_(quiz_ids))
+        .group_by(UserScore.quiz_id)
+    )
+    rows = result.all()
+    await db.execute(delete(QuizStats).where(QuizStats.quiz_id.in_(quiz_ids)))
+    db.add_all([
+        QuizStats(
+            quiz_id=row.quiz_id,
+            attempts=row.attempts,
+            score_sum=int(row.score_sum),
+            best_score=int(row.best_score),
+            last_attempt_at=row.last_attempt_at,
+        )
+        for row in rows
+    ])
+    await db.flush()
+
+
+async def delete_quiz_stats(db: AsyncSession, quiz_ids: Iterable[int]):
+    quiz_ids = list(quiz_ids)
+    if quiz_ids:
+        await db.execute(delete(QuizStats).where(QuizStats.quiz_id.in_(quiz_ids)))
+
+
+async def get_quiz_stats_map(db: AsyncSession, quiz_ids: Iterable[int]) -> Dict[int, QuizStats]:
+    quiz_ids = list(quiz_ids)
+    if not quiz_ids:
+        return {}
+    result = await db.execute(select(QuizStats).where(QuizStats.quiz_id.in_(quiz_ids)))
+    return {stats.quiz_id: stats for stats in result.scalars().all()}
+
+
+async def get_quiz_attempts(db: AsyncSession, quiz_id: int) -> int:
+    stats = await db.get(QuizStats, quiz_id)
+    return stats.attempts if stats else 0
+
+
+def average_score(stats: Optional[QuizStats]) -> int:
+    if stats is None or not stats.attempts:
+        return 0
+    return int(stats.score_sum / stats.attempts)
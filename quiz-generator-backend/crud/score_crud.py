@@ -1,10 +1,27 @@
+from datetime import datetime, timezone
+
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import UserScore, Quiz
 from sqlalchemy import select, delete, func
 
+from crud.leaderboard_crud import record_leaderboard_attempt, refresh_user_leaderboards
+from crud.quiz_stats_crud import record_attempt, refresh_quiz_stats, score_percent
+
 async def create_score(db: AsyncSession, score_data: dict):
     new_score = UserScore(**score_data)
     db.add(new_score)
+    await record_attempt(db, new_score.quiz_id, new_score.score, new_score.max_score)
+    difficulty = (
+        await db.execute(select(Quiz.difficulty).where(Quiz.id == new_score.quiz_id))
+    ).scalar()
+    if difficulty:
+        await record_leaderboard_attempt(
+            db,
+            new_score.user_id,
+            difficulty,
+            score_percent(new_score.score, new_score.max_score),
+            datetime.now(timezone.utc).replace(tzinfo=None),
+        )
     await db.commit()
     await db.refresh(new_score)
     return new_score
@@ -13,9 +30,13 @@ async def update_score_db(db: AsyncSession, score_id: int, score_data: dict, use
     score = await db.get(UserScore, score_id)
     if not score or score.user_id != user_id:
         return None
+    previous_quiz_id = score.quiz_id
     for key, value in score_data.items():
         setattr(score, key, value)
     try:
+        await db.flush()
+        await refresh_quiz_stats(db, [previous_quiz_id, score.quiz_id])
+        await refresh_user_leaderboards(db, [user_id])
         await db.commit()
         await db.refresh(score)
     except Exception as e:
@@ -78,6 +99,9 @@ async def delete_score_db(db: AsyncSession, score_id: int, user_id: int):
         return None
     try:
         await db.delete(score)
+        await db.flush()
+        await refresh_quiz_stats(db, [score.quiz_id])
+        await refresh_user_leaderboards(db, [user_id])
         await db.commit()
     except Exception as e:
         await db.rollback()
@@ -1,6 +1,7 @@
+import hashlib
 from datetime import datetime
 
-from sqlalchemy import select, update, and_
+from sqlalchemy import delete, select, update, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import PasswordResetToken, User
@@ -35,10 +36,13 @@ async def invalidate_user_reset_tokens(db: AsyncSession, user_id: int):
         .values(used_at=datetime.utcnow())
     )
 
+def hash_reset_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
 async def create_password_reset_token(db: AsyncSession, user_id: int, token: str, expires_at: datetime):
     reset_token = PasswordResetToken(
         user_id=user_id,
-        token=token,
+        token_hash=hash_reset_token(token),
         expires_at=expires_at
     )
     db.add(reset_token)
@@ -46,6 +50,27 @@ async def create_password_reset_token(db: AsyncSession, user_id: int, token: str
     return reset_token
 
 async def get_password_reset_token(db: AsyncSession, token: str):
-    result = await db.execute(select(PasswordResetToken).filter(PasswordResetToken.token == token))
+    result = await db.execute(
+        select(PasswordResetToken).filter(PasswordResetToken.token_hash == hash_reset_token(token))
+    )
     return result.scalars().first()
 
+async def delete_stale_reset_tokens(db: AsyncSession, before: datetime, limit: int) -> int:
+    """Delete up to ``limit`` tokens that expired before ``before``; commits.
+
+    Used tokens are left to expire like the rest, so the batch is a plain
+    range scan on the expires_at index.
+    """
+    stale_ids = (
+        select(PasswordResetToken.id)
+        .where(PasswordResetToken.expires_at < before)
+        .limit(limit)
+    )
+    result = await db.execute(
+        delete(PasswordResetToken)
+        .where(PasswordResetToken.id.in_(stale_ids))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount or 0
+
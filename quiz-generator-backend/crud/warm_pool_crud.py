@@ -0,0 +1,150 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Quiz, UserScore, WarmPoolDelivery, WarmPoolQuiz
+
+
+def _key_filter(topic: str, difficulty: str, language: str, questions_count: int):
+    return (
+        WarmPoolQuiz.topic == topic,
+        WarmPoolQuiz.difficulty == difficulty,
+        WarmPoolQuiz.language == language,
+        WarmPoolQuiz.questions_count == questions_count,
+    )
+
+
+async def add_warm_quiz(
+    db: AsyncSession,
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions_count: int,
+    questions: list,
+    fingerprint: str,
+) -> WarmPoolQuiz:
+    entry = WarmPoolQuiz(
+        topic=topic,
+        difficulty=difficulty,
+        language=language,
+        questions_count=questions_count,
+        questions=questions,
+        fingerprint=fingerprint,
+    )
+    db.add(entry)
+    await db.commit()
+    return entry
+
+
+async def warm_quiz_exists(
+    db: AsyncSession,
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions_count: int,
+    fingerprint: str,
+) -> bool:
+    result = await db.execute(
+        select(WarmPoolQuiz.id).where(
+            *_key_filter(topic, difficulty, language, questions_count),
+            WarmPoolQuiz.fingerprint == fingerprint,
+        ).limit(1)
+    )
+    return result.first() is not None
+
+
+async def count_fresh_warm_quizzes(
+    db: AsyncSession,
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions_count: int,
+    since: datetime,
+) -> int:
+    result = await db.execute(
+        select(func.count(WarmPoolQuiz.id)).where(
+            *_key_filter(topic, difficulty, language, questions_count),
+            WarmPoolQuiz.created_at >= since,
+        )
+    )
+    return int(result.scalar() or 0)
+
+
+async def take_warm_quiz(
+    db: AsyncSession,
+    user_id: int,
+    topic: str,
+    difficulty: str,
+    language: str,
+    questions_count: int,
+    since: datetime,
+) -> Optional[WarmPoolQuiz]:
+    """Pick the newest fresh entry this user has not received yet and record the delivery.
+
+    Does not commit: the delivery is saved together with the user's quiz.
+    """
+    seen = exists().where(
+        WarmPoolDelivery.quiz_id == WarmPoolQuiz.id,
+        WarmPoolDelivery.user_id == user_id,
+    )
+    result = await db.execute(
+        select(WarmPoolQuiz)
+        .where(
+            *_key_filter(topic, difficulty, language, questions_count),
+            WarmPoolQuiz.created_at >= since,
+            ~seen,
+        )
+        .order_by(WarmPoolQuiz.created_at.desc(), WarmPoolQuiz.id.desc())
+        .limit(1)
+    )
+    entry = result.scalars().first()
+    if entry is None:
+        return None
+
+    # A concurrent request of the same user may have claimed it first
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    claimed = await db.execute(
+        insert(WarmPoolDelivery)
+        .values(quiz_id=entry.id, user_id=user_id)
+        .on_conflict_do_nothing(index_elements=["quiz_id", "user_id"])
+    )
+    if claimed.rowcount != 1:
+        return None
+    await db.execute(
+        update(WarmPoolQuiz)
+        .where(WarmPoolQuiz.id == entry.id)
+        .values(deliveries=WarmPoolQuiz.deliveries + 1)
+    )
+    return entry
+
+
+async def delete_expired_warm_quizzes(db: AsyncSession, before: datetime) -> int:
+    expired = select(WarmPoolQuiz.id).where(WarmPoolQuiz.created_at < before)
+    # SQLite does not enforce ON DELETE CASCADE unless foreign keys are enabled
+    await db.execute(delete(WarmPoolDelivery).where(WarmPoolDelivery.quiz_id.in_(expired)))
+    result = await db.execute(delete(WarmPoolQuiz).where(WarmPoolQuiz.created_at < before))
+    await db.commit()
+    return result.rowcount or 0
+
+
+async def list_trending_topics(db: AsyncSession, since: datetime, limit: int) -> List[tuple]:
+    """(title, difficulty, language) triples with the most attempts since ``since``."""
+    attempts = func.count(UserScore.id)
+    result = await db.execute(
+        select(Quiz.title, Quiz.difficulty, Quiz.language, attempts.label("attempts"))
+        .join(UserScore, Quiz.id == UserScore.quiz_id)
+        .where(
+            UserScore.created_at >= since,
+            Quiz.title.isnot(None),
+            Quiz.difficulty.isnot(None),
+            Quiz.language.isnot(None),
+        )
+        .group_by(Quiz.title, Quiz.difficulty, Quiz.language)
+        .order_by(attempts.desc())
+        .limit(limit)
+    )
+    return [(row.title, row.difficulty, row.language) for row in result.all()]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, JSON, ForeignKey, TIMESTAMP, Index, Boolean, text
+from sqlalchemy import Column, Integer, BigInteger, String, JSON, ForeignKey, TIMESTAMP, Index, Boolean, Float, Date, LargeBinary, text
 from sqlalchemy.orm import relationship
 from database.database import Base
 from sqlalchemy.sql import func
@@ -6,12 +6,19 @@ from sqlalchemy.sql import func
 
 class Quiz(Base):
     __tablename__ = "quizzes"
+    __table_args__ = (
+        # Keyset pagination of the public browse page (btree scans serve both directions)
+        Index('ix_quizzes_public_created_at', 'is_public', 'created_at', 'id'),
+        Index('ix_quizzes_public_difficulty', 'is_public', 'difficulty', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255))
     description = Column(String)
     language = Column(String(255))
     questions = Column(JSON)
+    # len(questions), kept by crud/quiz_crud so listings never load the JSON
+    questions_count = Column(Integer, nullable=False, server_default=text("0"))
     difficulty = Column(String(255))
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Added owner field
     is_public = Column(Boolean, nullable=False, server_default=text('false'))
@@ -47,6 +54,53 @@ class UserScore(Base):
     )
 
 
+class QuizStats(Base):
+    """Per-quiz attempt aggregates over user_scores, kept in step by crud/score_crud.
+
+    Scores are summed as percentages (score * 100 / max_score, 0 when max_score
+    is not positive), so the average is score_sum / attempts.
+    """
+    __tablename__ = "quiz_stats"
+    __table_args__ = (
+        Index('ix_quiz_stats_attempts', 'attempts', 'quiz_id'),
+    )
+
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True)
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    score_sum = Column(Integer, nullable=False, server_default=text("0"))
+    best_score = Column(Integer, nullable=False, server_default=text("0"))
+    last_attempt_at = Column(TIMESTAMP, nullable=True)
+
+
+class LeaderboardEntry(Base):
+    """A user's standing on one difficulty's leaderboard for one period.
+
+    period is "all" or an ISO week such as "2026-W07". Scores are percentages
+    of the attempt's max_score; ties on the best score go to whoever reached
+    it first. Maintained by crud/score_crud.
+    """
+    __tablename__ = "leaderboard_entries"
+
+    difficulty = Column(String(255), primary_key=True)
+    period = Column(String(10), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    score_sum = Column(Integer, nullable=False, server_default=text("0"))
+    best_score = Column(Integer, nullable=False, server_default=text("0"))
+    best_at = Column(TIMESTAMP, nullable=False)
+
+
+# Ranking order, so top-N and rank lookups are index range scans
+Index(
+    'ix_leaderboard_entries_rank',
+    LeaderboardEntry.difficulty,
+    LeaderboardEntry.period,
+    LeaderboardEntry.best_score.desc(),
+    LeaderboardEntry.best_at,
+    LeaderboardEntry.user_id,
+)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -56,6 +110,8 @@ class User(Base):
     hashed_password = Column(String(255))
     avatar_url = Column(String(500), nullable=True)
     cover_url = Column(String(500), nullable=True)
+    # Embedded in access tokens; bumping it revokes every token issued before
+    token_version = Column(Integer, nullable=False, server_default=text("0"))
     created_at = Column(
         TIMESTAMP,
         server_default=func.now(),
@@ -70,8 +126,9 @@ class PasswordResetToken(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    token = Column(String(255), unique=True, index=True, nullable=False)
-    expires_at = Column(TIMESTAMP, nullable=False)
+    # SHA-256 hex digest of the emailed token; the token itself is never stored
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False, index=True)
     used_at = Column(TIMESTAMP, nullable=True)
     created_at = Column(
         TIMESTAMP,
@@ -86,6 +143,20 @@ class Generation(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # "success" rows count against the daily limit; "failed" rows are kept for accounting only
+    outcome = Column(String(20), nullable=False, server_default="success")
+    # "upstream" when this request called the provider, "cache" when it was served
+    # from the generation cache or joined another request's in-flight call
+    source = Column(String(20), nullable=True)
+    model = Column(String(100), nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    estimated_cost = Column(Float, nullable=True)
+    upstream_calls = Column(Integer, nullable=True)
+    repair_calls = Column(Integer, nullable=True)
+    invalid_questions = Column(Integer, nullable=True)
+    upstream_latency_ms = Column(Integer, nullable=True)
+    total_latency_ms = Column(Integer, nullable=True)
     created_at = Column(
         TIMESTAMP,
         server_default=func.now(),
@@ -94,6 +165,60 @@ class Generation(Base):
 
     user = relationship("User", back_populates="generations")
 
+    __table_args__ = (
+        Index("idx_generations_created_at", "created_at"),
+    )
+
+
+class GenerationQuota(Base):
+    """Per-user, per-day (UTC) count of reserved generation slots."""
+    __tablename__ = "generation_quotas"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    used = Column(Integer, nullable=False, server_default=text("0"))
+    updated_at = Column(
+        TIMESTAMP,
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False
+    )
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        Index("ix_generation_jobs_user_id", "user_id"),
+        Index("ix_generation_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    topic = Column(String(255), nullable=False)
+    difficulty = Column(String(255), nullable=False)
+    language = Column(String(255), nullable=False)
+    questions_count = Column(Integer, nullable=False, server_default=text("5"))
+    # pending -> running -> succeeded | failed
+    status = Column(String(20), nullable=False, server_default="pending")
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="SET NULL"), nullable=True)
+    error = Column(String(500), nullable=True)
+    started_at = Column(TIMESTAMP, nullable=True)
+    # Refreshed by the worker while it runs; stale heartbeats mark orphaned jobs
+    heartbeat_at = Column(TIMESTAMP, nullable=True)
+    finished_at = Column(TIMESTAMP, nullable=True)
+    created_at = Column(
+        TIMESTAMP,
+        server_default=func.now(),
+        nullable=False
+    )
+    updated_at = Column(
+        TIMESTAMP,
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False
+    )
+
 
 class Friendship(Base):
     __tablename__ = "friendships"
@@ -141,3 +266,68 @@ class Notification(Base):
 
     user = relationship("User", foreign_keys=[user_id])
     actor_user = relationship("User", foreign_keys=[actor_user_id])
+
+
+class WarmPoolQuiz(Base):
+    """A pre-generated quiz for a trending (topic, difficulty, language) triple.
+
+    Key columns hold the normalized request values; one entry is handed out to
+    many users, but at most once to each (see WarmPoolDelivery).
+    """
+    __tablename__ = "warm_pool_quizzes"
+    __table_args__ = (
+        Index("ix_warm_pool_quizzes_key", "topic", "difficulty", "language", "questions_count"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String(255), nullable=False)
+    difficulty = Column(String(255), nullable=False)
+    language = Column(String(255), nullable=False)
+    questions_count = Column(Integer, nullable=False)
+    questions = Column(JSON, nullable=False)
+    # sha1 of the questions; variants of one triple must differ in content
+    fingerprint = Column(String(40), nullable=False)
+    deliveries = Column(Integer, nullable=False, server_default=text("0"))
+    created_at = Column(
+        TIMESTAMP,
+        server_default=func.now(),
+        nullable=False
+    )
+
+
+class WarmPoolDelivery(Base):
+    __tablename__ = "warm_pool_deliveries"
+
+    quiz_id = Column(Integer, ForeignKey("warm_pool_quizzes.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(
+        TIMESTAMP,
+        server_default=func.now(),
+        nullable=False
+    )
+
+
+class QuestionFingerprint(Base):
+    """MinHash signature of one question of a quiz (see app.services.question_dedup)."""
+    __tablename__ = "question_fingerprints"
+    __table_args__ = (
+        Index("ix_question_fingerprints_quiz_id", "quiz_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    signature = Column(LargeBinary, nullable=False)
+
+
+class QuestionLshBucket(Base):
+    """LSH band key of a fingerprint; the primary key doubles as the lookup index."""
+    __tablename__ = "question_lsh_buckets"
+
+    bucket = Column(BigInteger, primary_key=True, autoincrement=False)
+    fingerprint_id = Column(
+        Integer,
+        ForeignKey("question_fingerprints.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
@@ -12,6 +12,14 @@ from sqlalchemy import text
 
 from database.database import engine, Base
 from app.routers import quizzes, scores, generator, auth, editor, friends, notifications, uploads
+from app.services.backfills import backfill_derived_tables
+from app.services.generation_jobs import generation_job_queue
+from app.services.global_stats import global_stats_cache
+from app.services.mistral_service import mistral_service
+from app.services.password_hashing import password_hasher
+from app.services.reset_token_sweeper import reset_token_sweeper
+from app.services.warm_pool import warm_pool
+from crud.quiz_search_crud import create_search_index
 
 logging.basicConfig(
     level=logging.INFO,
@@ -29,6 +37,58 @@ async def ensure_schema_compatibility():
         await conn.execute(text(
             "ALTER TABLE users ADD COLUMN IF NOT EXISTS cover_url VARCHAR(500)"
         ))
+        await conn.execute(text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0"
+        ))
+        await conn.execute(text(
+            "ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS questions_count INTEGER NOT NULL DEFAULT 0"
+        ))
+        for column_ddl in (
+            "outcome VARCHAR(20) NOT NULL DEFAULT 'success'",
+            "source VARCHAR(20)",
+            "model VARCHAR(100)",
+            "prompt_tokens INTEGER",
+            "completion_tokens INTEGER",
+            "estimated_cost DOUBLE PRECISION",
+            "upstream_calls INTEGER",
+            "repair_calls INTEGER",
+            "invalid_questions INTEGER",
+            "upstream_latency_ms INTEGER",
+            "total_latency_ms INTEGER",
+        ):
+            await conn.execute(text(f"ALTER TABLE generations ADD COLUMN IF NOT EXISTS {column_ddl}"))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_generations_created_at ON generations (created_at)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_quizzes_public_created_at ON quizzes (is_public, created_at, id)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_quizzes_public_difficulty ON quizzes (is_public, difficulty, id)"
+        ))
+        # Reset tokens are stored as SHA-256 digests. Plain tokens cannot be
+        # migrated without keeping them around, and they expire within the hour,
+        # so outstanding ones are dropped and users request a new link.
+        await conn.execute(text(
+            "ALTER TABLE password_reset_tokens ADD COLUMN IF NOT EXISTS token_hash VARCHAR(64)"
+        ))
+        await conn.execute(text(
+            "DELETE FROM password_reset_tokens WHERE token_hash IS NULL"
+        ))
+        await conn.execute(text(
+            "ALTER TABLE password_reset_tokens DROP COLUMN IF EXISTS token"
+        ))
+        await conn.execute(text(
+            "ALTER TABLE password_reset_tokens ALTER COLUMN token_hash SET NOT NULL"
+        ))
+        await conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_password_reset_tokens_token_hash "
+            "ON password_reset_tokens (token_hash)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_expires_at "
+            "ON password_reset_tokens (expires_at)"
+        ))
 
         db_url = os.getenv("DATABASE_URL", "")
         if "sqlite" not in db_url:
@@ -70,10 +130,24 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up — creating database tables if needed")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await create_search_index(conn)
     await ensure_schema_compatibility()
+    await backfill_derived_tables()
     logger.info("Database tables ready")
+    await generation_job_queue.start()
+    await warm_pool.start()
+    await reset_token_sweeper.start()
+    await global_stats_cache.start()
     yield
-    # Shutdown — dispose engine to release all pooled connections
+    # Shutdown — stop background workers, close the pooled upstream HTTP client,
+    # then the database engine
+    await global_stats_cache.stop()
+    await reset_token_sweeper.stop()
+    await warm_pool.stop()
+    await generation_job_queue.stop()
+    await mistral_service.aclose()
+    password_hasher.shutdown()
+    # Dispose engine to release all pooled connections
     logger.info("Shutting down — disposing database engine")
     await engine.dispose()
     logger.info("Database engine disposed")
@@ -0,0 +1,25 @@
+"""
+Rebuild: recompute the per-difficulty leaderboards (all-time and weekly) from
+user_scores. The API backfills the table on startup while it is empty; run
+this any time the entries are suspected to have drifted. Safe to re-run.
+  python rebuild_leaderboards.py
+"""
+import asyncio
+import logging
+
+from app.services.backfills import rebuild_leaderboards
+from database.database import Base, engine
+
+
+async def rebuild():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rebuilt = await rebuild_leaderboards()
+
+    await engine.dispose()
+    print(f"Rebuild complete: {rebuilt} users processed.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(rebuild())
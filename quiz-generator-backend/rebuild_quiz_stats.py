@@ -0,0 +1,26 @@
+"""
+Rebuild: recompute the quiz_stats table (attempts, score sum, best score, last
+attempt per quiz) from user_scores. The API backfills the table on startup
+while it is empty; run this any time the aggregates are suspected to have
+drifted. Safe to re-run.
+  python rebuild_quiz_stats.py
+"""
+import asyncio
+import logging
+
+from app.services.backfills import rebuild_quiz_stats
+from database.database import Base, engine
+
+
+async def rebuild():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rebuilt = await rebuild_quiz_stats()
+
+    await engine.dispose()
+    print(f"Rebuild complete: {rebuilt} quizzes processed.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(rebuild())
@@ -33,6 +33,21 @@ class QuizResponse(BaseModel):
     language: str
     difficulty: str
     questions: List[Dict]
+    questions_count: int = 0
+    created_at: datetime
+    is_public: bool
+
+    # Pydantic v2
+    model_config = ConfigDict(from_attributes=True)
+
+class QuizSummaryResponse(BaseModel):
+    """A quiz in list views: everything but the questions themselves."""
+    id: int
+    title: str
+    description: Optional[str] = None
+    language: str
+    difficulty: str
+    questions_count: int
     created_at: datetime
     is_public: bool
 
@@ -244,7 +244,12 @@ export default function ProfilePage() {
         headers: { 'Content-Type': 'application/json', ...authHeader() },
         body: JSON.stringify({ current_password: currentPassword, new_password: newPassword }),
       });
-      if (res.ok) { toast('Password changed', 'success'); setCurrentPassword(''); setNewPassword(''); }
+      if (res.ok) {
+        // Changing the password revokes existing tokens; keep this session with the new one
+        const data = await res.json().catch(() => ({}));
+        if (data.access_token) localStorage.setItem('quizToken', data.access_token);
+        toast('Password changed', 'success'); setCurrentPassword(''); setNewPassword('');
+      }
       else { toast(await getErrorMessage(res, 'Failed to change password.'), 'error'); }
     } catch { toast('Failed to change password.', 'error'); }
     finally { setChangingPassword(false); }
@@ -555,7 +560,7 @@ export default function ProfilePage() {
                           <div className="flex flex-wrap items-center gap-2 mt-1.5">
                             <Badge variant={q.difficulty}>{q.difficulty}</Badge>
                             <span className="text-xs text-gray-400">{q.language}</span>
-                            <span className="text-xs text-gray-400">{(q.questions || []).length} questions</span>
+                            <span className="text-xs text-gray-400">{q.questions_count ?? (q.questions || []).length} questions</span>
                           </div>
 
                           <div className="mt-4 flex flex-wrap items-center gap-2">
@@ -60,8 +60,8 @@ export default function TemplatePickerModal({ isOpen, onClose, onSelect, apiBase
 
   const handleUse = async (item) => {
     try {
-      // Built-in templates and my quizzes already contain full questions
-      if (activeTab === 'templates' || activeTab === 'my') {
+      // Built-in templates already contain full questions
+      if (activeTab === 'templates') {
         const normalized = {
           title: item.title,
           description: item.description || '',
@@ -73,11 +73,14 @@ export default function TemplatePickerModal({ isOpen, onClose, onSelect, apiBase
         onSelect(normalized);
         return;
       }
-      // Public list needs a fetch for full content
-      if (activeTab === 'public' && item?.id) {
+      // Quiz lists only carry summaries, so fetch the full content
+      if ((activeTab === 'public' || activeTab === 'my') && item?.id) {
         setLoading(true);
         try {
-          const r = await fetch(`${apiBase}/quizzes/${item.id}`);
+          const token = typeof window !== 'undefined' ? localStorage.getItem('quizToken') : null;
+          const r = activeTab === 'my'
+            ? await fetch(`${apiBase}/editor/quiz/${item.id}`, { headers: { 'Authorization': `Bearer ${token}` } })
+            : await fetch(`${apiBase}/quizzes/${item.id}`);
           if (!r.ok) throw new Error(await getErrorMessage(r, 'Failed to load quiz.'));
           const full = await r.json();
           const normalized = {
@@ -134,7 +137,7 @@ export default function TemplatePickerModal({ isOpen, onClose, onSelect, apiBase
                         <span className="mr-2">{item.language || 'English'}</span>
                         <span className="mr-2">{item.difficulty || 'easy'}</span>
                         {Array.isArray(item.questions) && <span>{item.questions.length} questions</span>}
-                        {!Array.isArray(item.questions) && typeof item.questionsCount === 'number' && <span>{item.questionsCount} questions</span>}
+                        {!Array.isArray(item.questions) && typeof (item.questions_count ?? item.questionsCount) === 'number' && <span>{item.questions_count ?? item.questionsCount} questions</span>}
                       </div>
                     </div>
                     <button onClick={() => handleUse(item)} className="btn-primary px-3 py-2 text-sm">Use</button>